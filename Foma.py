@@ -1,17 +1,26 @@
 """
 Ключевой модуль. Запускает сканирование папки с html-таблицами глаголов, выделяет из них модели спряжения
-и создаёт на их основе конечный морфологический преобразователь, который затем сохраняется в файл latest_FST.
+и создаёт на их основе конечный морфологический преобразователь, который затем сохраняется в файл latest_FST
+(объект pyfoma в latest_FST.pkl и компактная двоичная копия для быстрого открытия в latest_FST.lvfst).
+Преобразователи отдельных моделей собираются параллельно в пуле процессов (число процессов задаётся ключом -j).
 """
 from pyfoma import FST
-from Morphology import Model
-from parse import directory_scan
+from pyfoma.fst import State
+from Morphology import Model, ModelInducer
+from parse import CORPUS_CACHE, list_files, scan_models
+from fstcache import EMPTY, FstCache, model_key, node_key
+from fstfile import export
+from instrument import note_size, pool_map, stage
+import instrument
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import os
 import pickle
+import time
 
-define = {}
 dir_path = os.path.dirname(os.path.realpath(__file__))
-verbdir = dir_path + '\\Verbs'
-verbs = [x for x in os.listdir(verbdir)]
+verbdir = os.path.join(dir_path, 'Verbs')
+STATE = 'latest_models.pkl' # модели и опись файлов последней сборки, нужны update.py
 
 def from_model(model: Model):
     vars = model.expressions
@@ -28,7 +37,7 @@ def from_model(model: Model):
                 lemma[i] = r"''"
             if len(vars) - i != 1:
                 if form[i] != lemma[i]:
-                    s += f"({form[i]}:{lemma[i]})"
+                    s += f"(({form[i]}):({lemma[i]}))" # в pyfoma ":" связывает только соседние символы
                 else:
                     s += f"{lemma[i]}"
             else:
@@ -37,34 +46,364 @@ def from_model(model: Model):
         s = s.strip('.')
         yield(s)
 
-def define_affix():
+def pair_labels(form: str, lemma: str, tag: str | None = None) -> list[tuple]:
+    """
+    Метки переходов для пары "форма : лемма" — символы пар друг против друга, недостающие заменены эпсилоном
+    (одинаковые пары — метки из одного символа, как в pyfoma). tag — многосимвольный символ граммемы в конце выхода.
+    """
+    output = list(lemma) + ([tag] if tag else [])
+    labels = []
+    for i in range(max(len(form), len(output))):
+        a = form[i] if i < len(form) else ''
+        b = output[i] if i < len(output) else ''
+        labels.append((a,) if a == b else (a, b))
+    return labels
+
+def model_fst(model: Model, affixes: list | None = None) -> FST:
+    """
+    Преобразователь модели, собранный прямо из таблицы аффиксов, без текста регулярных выражений.
+    Язык тот же, что у объединения выражений from_model. Каждый аффикс — цепочка: часть основы (по образцу
+    fliss.find_pattern), пары "форма : лемма" её аффикса, следующая часть основы и т. д., а в конце — остаток леммы
+    и символ граммемы. Начала цепочек складываются в бор, так что общие части аффиксов проходятся
+    по одним и тем же состояниям, а одинаковые хвосты выхода (остаток леммы с граммемой) собираются один раз.
+    Как и в from_model, wildcard в начале первой части основы опускается: его покрывает $letter+.
+    affixes — только эти аффиксы модели (shards.py собирает части анализатора из аффиксов с общим концом).
+    """
+    patterns = model.stem_patterns()
+    if not patterns:
+        # у основы нет ни одной части (ferō, tulī, lātum — основа "_"): цепочки аффиксов были бы пустыми,
+        # и в $letter+ $affix такая модель давала бы любому слову разбор без граммемы; модель пропускается
+        return FST()
+    lemma = model.lemma.form.split('_')
+    head_trie = {} # метка -> поддерево; число i — часть основы i; None -> хвосты выхода, которыми кончаются аффиксы
+    for affix in model.affixes if affixes is None else affixes:
+        form = affix.form.split('_')
+        items = []
+        for i in range(len(patterns)):
+            items.append(i)
+            items += pair_labels(form[i], lemma[i], f'\t{affix.grammeme}' if i == len(patterns) - 1 else None)
+        head = len(items)
+        while head > 0 and not isinstance(items[head - 1], int) and items[head - 1][0] == '' and len(items[head - 1]) == 2:
+            head -= 1 # хвост — метки, которые ничего не читают и только пишут
+        node = head_trie
+        for item in items[:head]:
+            node = node.setdefault(item, {})
+        node.setdefault(None, set()).add(tuple(items[head:]))
+
+    fst = FST()
+    states = {fst.initialstate}
+    alphabet = set()
+    chains = {} # хвост выхода -> состояние, с которого он читается
+
+    def new_state():
+        state = State()
+        states.add(state)
+        return state
+
+    def add(source, target, label):
+        source.add_transition(target, label)
+        alphabet.update(x for x in label if x)
+
+    def chain(tail):
+        if tail not in chains:
+            if tail:
+                state = new_state()
+                add(state, chain(tail[1:]), tail[0])
+            else:
+                state = new_state()
+                fst.finalstates.add(state)
+                state.finalweight = 0
+            chains[tail] = state
+        return chains[tail]
+
+    def strings(start, values) -> list[State]:
+        """Бор строк values от состояния start; возвращает состояния, где строки кончаются."""
+        nodes = {'': start}
+        for value in sorted(values):
+            for j in range(1, len(value) + 1):
+                if value[:j] not in nodes:
+                    nodes[value[:j]] = new_state()
+                    add(nodes[value[:j-1]], nodes[value[:j]], (value[j-1],))
+        return [nodes[value] for value in sorted(values)]
+
+    def stem_part(start, i) -> list[State]:
+        prefixes, suffixes = patterns[i]
+        if suffixes is None:
+            return strings(start, prefixes)
+        if i == 0 and prefixes == {''}:
+            return strings(start, suffixes)
+        middle = new_state()
+        for state in strings(start, prefixes):
+            state.add_transition(middle, ('.',))
+        alphabet.add('.')
+        return strings(middle, suffixes)
+
+    def build_node(node, state):
+        for key, child in node.items():
+            if key is None:
+                for tail in child:
+                    if tail:
+                        add(state, chain(tail[1:]), tail[0])
+                    else:
+                        fst.finalstates.add(state)
+                        state.finalweight = 0
+            elif isinstance(key, int):
+                exits = stem_part(state, key)
+                follow = State() # продолжение строится один раз, а его переходы копируются во все концы части основы
+                build_node(child, follow)
+                for exit in exits:
+                    for label, transitions in follow.transitions.items():
+                        for t in transitions:
+                            exit.add_transition(t.targetstate, label, t.weight)
+                    if follow in fst.finalstates:
+                        fst.finalstates.add(exit)
+                        exit.finalweight = 0
+                fst.finalstates.discard(follow)
+            else:
+                target = new_state()
+                add(state, target, key)
+                build_node(child, target)
+
+    build_node(head_trie, fst.initialstate)
+    for state in states: # "." — любой символ не из алфавита, поэтому символы алфавита добавляются к нему явно, как в pyfoma
+        for t in list(state.transitions.get(('.',), ())):
+            for symbol in alphabet - {'.'}:
+                state.add_transition(t.targetstate, (symbol,))
+    fst.states = states
+    fst.alphabet = alphabet
+    return fst
+
+def normalize(fst: FST) -> FST:
+    for step in ('epsilon_remove', 'determinize', 'minimize'):
+        with stage(step) as info:
+            note_size(info, fst)
+            fst = getattr(fst, step)()
+            note_size(info, fst, '_after')
+    return fst
+
+def merge(fsts: list[FST]) -> FST:
+    """Объединить один-два преобразователя и один раз детерминизировать и минимизировать результат."""
+    if len(fsts) == 1:
+        return fsts[0]
+    with stage('merge') as info:
+        fst = normalize(fsts[0] | fsts[1])
+        note_size(info, fst)
+    return fst
+
+def merge_level(fsts: list[FST], pool=None) -> list[FST]:
+    """Один уровень сбалансированного дерева объединений: соседние преобразователи сливаются попарно."""
+    pairs = [fsts[i:i+2] for i in range(0, len(fsts), 2)]
+    return list(pool_map(pool, merge, pairs))
+
+def reduce_union(fsts: list[FST], pool=None, verbose=False) -> FST:
+    """
+    Объединение списка преобразователей сбалансированным деревом, а не левой свёрткой:
+    каждый промежуточный результат детерминизируется и минимизируется один раз на своём уровне,
+    а слияния одного уровня независимы и могут идти в пуле процессов. Вершина дерева уже нормализована
+    слиянием (или это единственный входной преобразователь), поэтому возвращается как есть.
+    """
+    if not fsts:
+        return FST()
+    level = list(fsts)
+    while len(level) > 1:
+        level = merge_level(level, pool)
+        if verbose:
+            print(f"Преобразователей: {len(level)}, состояний: {sum(len(x) for x in level)}...")
+    return level[0]
+
+def compile_model(model: Model) -> FST:
+    """Преобразователь одной модели, собранный напрямую (model_fst) и один раз детерминизированный и минимизированный."""
+    with stage('compile', model=str(model.name)) as info:
+        fst = normalize(model_fst(model))
+        note_size(info, fst)
+    return fst
+
+def compile_model_regex(model: Model) -> FST:
+    """Прежний способ: объединение преобразователей регулярных выражений всех аффиксов модели. Оставлен для сверки."""
+    fsts = [FST.re(regex) for regex in from_model(model)]
+    return reduce_union(fsts) if len(fsts) > 1 else normalize(reduce_union(fsts))
+
+def compile_models(models: list[Model], pool=None, cache: FstCache | None = None) -> list[FST]:
+    """
+    Преобразователи списка моделей. Если задан кэш, из него берутся уже скомпилированные модели,
+    а компилируются (и попадают в кэш) только новые или изменившиеся.
+    """
+    conjugs = [None] * len(models)
+    keys = [model_key(model) for model in models] if cache is not None else []
+    if cache is not None:
+        for i, key in enumerate(keys):
+            conjugs[i] = cache.get(key)
+    missing = [i for i in range(len(models)) if conjugs[i] is None]
+    todo = [models[i] for i in missing]
+    compiled = pool_map(pool, compile_model, todo)
+    for i, fst in zip(missing, compiled):
+        conjugs[i] = fst
+        if cache is not None:
+            cache.put(keys[i], fst)
+    print(f"Моделей скомпилировано: {len(missing)}, взято из кэша: {len(models) - len(missing)}")
+    return conjugs
+
+def tree_keys(leaves: list[str]) -> list[list[str]]:
+    """
+    Ключи всех узлов дерева объединений по ключам листьев, уровень за уровнем, с тем же попарным делением,
+    что и в reduce_union. Непарный последний узел уровня переходит выше как есть и сохраняет свой ключ.
+    """
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append([node_key(level[i], level[i+1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)])
+    return levels
+
+def cached_union(models: list[Model | None], pool=None, cache: FstCache | None = None, verbose=False) -> FST:
+    """
+    То же, что reduce_union(compile_models(models)), но каждый узел дерева объединений хранится в кэше
+    под ключом своих детей. Сначала сверху вниз ищутся узлы, которых нет в кэше, затем снизу вверх
+    компилируются недостающие модели и сливаются только недостающие узлы: если изменились k моделей,
+    работы — порядка k * log(числа моделей) слияний. None на месте модели — пустой преобразователь
+    (модель, у которой не осталось основ), чтобы номера остальных моделей и форма дерева не менялись.
+    """
+    levels = tree_keys([model_key(model) if model is not None else EMPTY for model in models])
+    if not levels[0]:
+        return FST()
+    children = lambda k, j: [c for c in (2*j, 2*j+1) if c < len(levels[k-1])]
+    missing = [set() for _ in levels]
+
+    def mark(k, j):
+        key = levels[k][j]
+        if key == EMPTY or cache.has(key):
+            return
+        missing[k].add(j)
+        if k > 0:
+            for c in children(k, j):
+                mark(k - 1, c)
+
+    mark(len(levels) - 1, 0)
+    values = {} # узлы, собранные в этом запуске: (уровень, номер) -> преобразователь
+
+    def value(k, j):
+        if (k, j) in values:
+            return values[k, j]
+        if levels[k][j] == EMPTY:
+            return FST()
+        fst = cache.get(levels[k][j])
+        if fst is None: # запись успели вытеснить из кэша — собираем узел заново
+            fst = compile_model(models[j]) if k == 0 else merge([value(k - 1, c) for c in children(k, j)])
+        return fst
+
+    todo = sorted(missing[0])
+    compiled = pool_map(pool, compile_model, [models[j] for j in todo])
+    for j, fst in zip(todo, compiled):
+        values[0, j] = fst
+        cache.put(levels[0][j], fst)
+    merges = 0
+    for k in range(1, len(levels)):
+        todo = sorted(missing[k])
+        pairs = [[value(k - 1, c) for c in children(k, j)] for j in todo]
+        merged = pool_map(pool, merge, pairs)
+        for j, pair, fst in zip(todo, pairs, merged):
+            values[k, j] = fst
+            if len(pair) == 2:
+                cache.put(levels[k][j], fst)
+                merges += 1
+        for j in range(len(levels[k - 1])): # нижний уровень больше не нужен
+            values.pop((k - 1, j), None)
+    if verbose:
+        print(f"Моделей скомпилировано: {len(missing[0])}, взято из кэша: {len(models) - len(missing[0])}, слияний: {merges}")
+    return value(len(levels) - 1, 0) # вершина — слияние или скомпилированная модель, она уже нормализована
+
+def define_affix(models: list[Model | None], workers: int | None = None, cache: FstCache | None = None) -> FST:
+    """
+    Собрать преобразователь аффиксов всех моделей. Модели компилируются в пуле из workers процессов
+    (по умолчанию — по числу ядер; при workers=1 всё делается в текущем процессе), затем сливаются деревом.
+    С кэшем берутся готовые модели и готовые узлы дерева (cached_union).
+    """
+    if cache is not None:
+        if workers == 1:
+            return cached_union(models, cache=cache, verbose=True)
+        with ProcessPoolExecutor(workers) as pool:
+            return cached_union(models, pool, cache, verbose=True)
+    models = [model for model in models if model is not None]
+    if workers == 1:
+        return reduce_union(compile_models(models), verbose=True)
+    with ProcessPoolExecutor(workers) as pool:
+        return reduce_union(compile_models(models, pool), pool, verbose=True)
+
+def choose_models(workers: int | None = None, seed=None, corpus: str | None = CORPUS_CACHE) -> tuple[ModelInducer, dict]:
+    verbs = [x for x in os.listdir(verbdir)]
     while True:
         size = input('Введите желаемый размер обучающей выборки: ')
         if size == "max":
-            models = directory_scan(len(verbs))
-            break
+            return scan_models(list_files(verbdir, seed), len(verbs), workers, seed, corpus)
         elif int(size) > 0 and int(size) <= len(verbs):
-            models = directory_scan(int(size))
-            break
+            return scan_models(list_files(verbdir, seed), int(size), workers, seed, corpus)
         else:
             print(f'Неверный размер; введите целое число от 1 до {len(verbs)}')
-    total_conjug = FST()
-    for model in models:
-        conjug = FST()
-        for regex in from_model(model):
-            conjug |= FST.re(regex)
-            conjug = conjug.epsilon_remove().determinize().minimize()
-        total_conjug |= conjug
-        total_conjug = total_conjug.epsilon_remove().determinize().minimize()
-        print(f"Состояний: {len(total_conjug)}...")
-    return total_conjug
-
-define['vowel'] = FST.re(r"[aeouiy]\-?")
-define['cons'] = FST.re("[a-z] - $vowel", define)
-define['letter'] = FST.re("$cons | $vowel", define)
-define['affix'] = define_affix()
-fsm = FST.re('$letter+ $affix', define)
-print(f"FST готов, состояний: {len(fsm)}")
-
-with open('latest_FST.pkl', 'wb') as outp:
-    pickle.dump(fsm, outp, pickle.HIGHEST_PROTOCOL)
+
+def letters() -> dict:
+    """Определения $vowel, $cons и $letter: буква основы перед аффиксом (гласная может нести макрон "-")."""
+    define = {}
+    define['vowel'] = FST.re(r"[aeouiy]\-?")
+    define['cons'] = FST.re("[a-z] - $vowel", define)
+    define['letter'] = FST.re("$cons | $vowel", define)
+    return define
+
+def attach_letters(affix: FST, define: dict | None = None) -> FST:
+    """Полный анализатор по преобразователю аффиксов: перед аффиксом — одна или больше букв основы."""
+    define = dict(define or letters())
+    define['affix'] = affix
+    with stage('letters') as info:
+        fst = FST.re('$letter+ $affix', define)
+        note_size(info, fst)
+    return fst
+
+def build(models: list[Model | None], workers: int | None = None, cache: FstCache | None = None) -> FST:
+    return attach_letters(define_affix(models, workers, cache))
+
+def save_state(path: str, inducer: ModelInducer, manifest: dict, started: int, listed: list[str] | None = None):
+    """
+    Сохранить всё, что нужно для инкрементного обновления (update.py): модели вместе с индексом их сигнатур,
+    опись прочитанных файлов (имя -> размер, время изменения, sha256), время начала сборки в наносекундах
+    и имена всех файлов папки на момент сборки (прочитанных и не попавших в выборку), чтобы отличать новые.
+    """
+    state = {'inducer': inducer, 'manifest': manifest, 'started': started, 'listed': listed or []}
+    with stage('pickle', file=path), open(path, 'wb') as outp:
+        pickle.dump(state, outp, pickle.HIGHEST_PROTOCOL)
+
+def load_state(path: str) -> dict:
+    with open(path, 'rb') as inp:
+        return pickle.load(inp)
+
+def save_fst(fsm: FST):
+    with stage('pickle', file='latest_FST.pkl'), open('latest_FST.pkl', 'wb') as outp:
+        pickle.dump(fsm, outp, pickle.HIGHEST_PROTOCOL)
+    with stage('export', file='latest_FST.lvfst'):
+        export(fsm, 'latest_FST.lvfst')
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Построение морфологического анализатора по таблицам из папки Verbs.')
+    argparser.add_argument('-j', '--workers', type=int, default=None, help='число процессов для чтения таблиц и компиляции моделей (по умолчанию — по числу ядер)')
+    argparser.add_argument('--seed', default=None, help='зерно случайного выбора таблиц, чтобы выборку можно было повторить')
+    argparser.add_argument('--cache', default=os.path.join(dir_path, 'fst_cache'), help='папка кэша скомпилированных моделей')
+    argparser.add_argument('--cache-size', type=int, default=1024, help='предельный размер кэша в мегабайтах')
+    argparser.add_argument('--no-cache', action='store_true', help='читать все таблицы и компилировать все модели заново, не трогая кэши')
+    argparser.add_argument('--corpus-cache', default=CORPUS_CACHE, help='файл кэша разобранных таблиц')
+    argparser.add_argument('--trace', default=None, help='записать замеры этапов сборки в этот JSON-файл')
+    argparser.add_argument('--profile', action='store_true', help='вместе с замерами снять профиль cProfile (<trace>.prof)')
+    argparser.add_argument('--trace-memory', action='store_true', help='замерять память этапов через tracemalloc (медленнее)')
+    argparser.add_argument('--trace-objects', action='store_true', help='считать объекты Python до и после каждого этапа (медленнее)')
+    args = argparser.parse_args()
+
+    if args.trace:
+        instrument.enable(args.profile, args.trace_memory, args.trace_objects)
+    cache = None if args.no_cache else FstCache(args.cache, args.cache_size << 20)
+    started = time.time_ns()
+    listed = sorted(os.fsdecode(name) for name in os.listdir(os.fsencode(verbdir)))
+    inducer, manifest = choose_models(args.workers, args.seed, None if args.no_cache else args.corpus_cache)
+    fsm = build(inducer.models, args.workers, cache)
+    print(f"FST готов, состояний: {len(fsm)}")
+
+    save_fst(fsm)
+    save_state(STATE, inducer, manifest, started, listed)
+    if args.trace:
+        instrument.export(args.trace)
+        print(f"Замеры этапов записаны в {args.trace}")
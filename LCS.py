@@ -88,4 +88,81 @@ class LcsFinder:
             best_lcs = self.compare_LCS(lcs, reversed_lcs)
             new_words = words[:-2]
             new_words.append(best_lcs)
-            return self.multi_LCS(new_words)
\ No newline at end of file
+            return self.multi_LCS(new_words)
+
+class BitLcsFinder(LcsFinder):
+    """
+    Тот же поиск НОП, но без матрицы numpy и без рекурсии. Строка i таблицы динамического
+    программирования хранится как битовый вектор длины len(second) (алгоритм Хюррё): нулевой бит
+    в позиции j-1 означает, что значение в клетке (i, j) на единицу больше, чем в клетке (i, j-1).
+    Значение любой клетки восстанавливается подсчётом нулей в младших битах строки.
+    Ответы совпадают с LcsFinder, который остаётся эталонной реализацией.
+    """
+
+    def length(self, first, second):
+        """Битовые строки таблицы для first и second: rows[k] соответствует first[:k]."""
+        masks = {}
+        for j, char in enumerate(second):
+            masks[char] = masks.get(char, 0) | (1 << j)
+        full = (1 << len(second)) - 1
+        rows = [full]
+        row = full
+        for char in first:
+            match = row & masks.get(char, 0)
+            row = ((row + match) | (row - match)) & full
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def cell(rows, i, j):
+        """Значение клетки (i, j) таблицы НОП по битовым строкам."""
+        return j - (rows[i] & ((1 << j) - 1)).bit_count()
+
+    def backtrack(self, rows, first, second, i, j):
+        while i > 0 and j > 0:
+            if first[i-1] == '_':
+                self.gap_on()
+                i -= 1
+            elif second[j-1] == '_':
+                self.gap_on()
+                j -= 1
+            elif first[i-1] == second[j-1]:
+                self.gap_off()
+                self.LCS += first[i-1]
+                i -= 1
+                j -= 1
+            elif self.cell(rows, i, j-1) > self.cell(rows, i-1, j): # если слева больше, чем сверху, иди влево
+                self.gap_on()
+                j -= 1
+            else: # иначе иди вверх
+                self.gap_on()
+                i -= 1
+        if i != j:
+            self.gap_on()
+        return ''
+
+    def multi_LCS(self, words: list[str]):
+        words = list(words)
+        while len(words) > 1:
+            second = words.pop()
+            first = words.pop()
+            lcs = self.pair_LCS(first, second)
+            reversed_lcs = self.reversed_LCS(first, second)
+            words.append(self.compare_LCS(lcs, reversed_lcs))
+        return words[0]
+
+
+BACKENDS = {'reference': LcsFinder, 'bit': BitLcsFinder}
+shared_finders = {}
+
+def make_finder(backend: str = 'bit') -> LcsFinder:
+    """Создать искатель НОП по имени реализации: 'bit' (по умолчанию) или 'reference' (исходная, для сверки)."""
+    if backend not in BACKENDS:
+        raise Exception(f"Error: no such LCS backend {backend}")
+    return BACKENDS[backend]()
+
+def shared_finder(backend: str = 'bit') -> LcsFinder:
+    """Один искатель НОП на процесс для каждой реализации, чтобы не создавать его заново для каждой лексемы."""
+    if backend not in shared_finders:
+        shared_finders[backend] = make_finder(backend)
+    return shared_finders[backend]
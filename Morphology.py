@@ -2,35 +2,80 @@
 Классы морфологических единиц разных уровней, от набора признаков морфемы до модели спряжения.
 """
 
-from fliss import find_regex
+from collections import Counter
+from fliss import find_pattern, find_regex
+from instrument import stage
+from macrons import demacronize, remacronize
+
+# Признаки граммем Викисловаря: лицо, число, время, залог, наклонение, формы глагола, падеж, род.
+# Каждому признаку соответствует бит; признаки, которых нет в списке, получают следующие биты при первой встрече.
+INVENTORY = ['None', '1', '2', '3', 's', 'p',
+             'pres', 'impf', 'fut', 'perf', 'plup', 'futp',
+             'act', 'pass', 'ind', 'sub', 'imp', 'inf', 'part', 'ger', 'sup',
+             'nom', 'gen', 'dat', 'acc', 'abl', 'voc', 'm', 'f', 'n']
+FEATURE_BITS = {feature: 1 << i for i, feature in enumerate(INVENTORY)}
+
+def feature_bit(feature: str) -> int:
+    if feature not in FEATURE_BITS:
+        FEATURE_BITS[feature] = 1 << len(FEATURE_BITS)
+    return FEATURE_BITS[feature]
 
 class Grammeme:
     """
     Набор грамматических признаков. Используется в определении морфем.
     У корневых морфем граммема состоит только из признака None.
+    Граммемы неизменяемы и интернированы: для одного набора признаков существует один объект.
+    Порядок признаков (features) сохраняется для вывода и сравнения, а пересечение и разность
+    считаются по битовой маске признаков (bits) и запоминаются.
     """
-    def __init__(self, features: list[str]):
-        if features:
-            self.features = tuple(features)
-        else:
-            self.features = tuple(['None'])
+    __slots__ = ('features', 'bits', 'hash')
+    interned = {} # кортеж признаков -> граммема
+    operations = {} # (признаки, маска) -> граммема из тех признаков, что попали в маску
+
+    def __new__(cls, features: list[str]):
+        features = tuple(features) if features else ('None',)
+        grammeme = cls.interned.get(features)
+        if grammeme is None:
+            grammeme = super().__new__(cls)
+            grammeme.features = features
+            grammeme.bits = 0
+            for feature in features:
+                grammeme.bits |= feature_bit(feature)
+            grammeme.hash = hash(features)
+            cls.interned[features] = grammeme
+        return grammeme
+
+    def __reduce__(self):
+        # при распаковке граммема снова интернируется, а биты считаются заново: в другом процессе они могут быть другими
+        return (Grammeme, (list(self.features),))
     
     def __repr__(self) -> str:
         return '|'.join(self.features)
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, self.__class__):
             return self.features == other.features
         return False
     
     def __hash__(self):
-        return hash(self.__repr__())
+        return self.hash
+
+    def select(self, bits: int):
+        """Граммема из тех признаков (в прежнем порядке), чьи биты есть в маске."""
+        key = (self.features, bits)
+        result = Grammeme.operations.get(key)
+        if result is None:
+            result = Grammeme([x for x in self.features if FEATURE_BITS[x] & bits])
+            Grammeme.operations[key] = result
+        return result
     
     def __sub__(self, other):
-        return Grammeme([x for x in self.features if x not in other.features])
+        return self.select(self.bits & ~other.bits)
     
     def __and__(self, other):
-        return Grammeme([x for x in self.features if x in other.features])
+        return self.select(self.bits & other.bits)
     
 class WordForm:
     """
@@ -39,6 +84,8 @@ class WordForm:
         исходная форма (лемма),\n 
         грамматическая роль (граммема).
     """
+    __slots__ = ('form', 'lemma', 'grammeme')
+
     def __init__(self, form: str, lemma: str, grammeme: Grammeme):
         self.form = form
         self.lemma = lemma
@@ -97,10 +144,12 @@ class Lexeme:
                 raise Exception(f"Wordform with alien lemma {w.lemma} detected while creating lexeme {self.lemma}!")
             w.form = demacronize(w.form)
 
-    def extract_paradigm(self):
-        from LCS import LcsFinder
-        LCSFinder = LcsFinder()
-        stem = LCSFinder.multi_LCS([x.form for x in self.forms])
+    def extract_paradigm(self, backend: str = 'bit'):
+        """Выделить основу и аффиксы. backend — реализация НОП из LCS.BACKENDS ('reference' — исходная)."""
+        from LCS import shared_finder
+        LCSFinder = shared_finder(backend)
+        with stage('lcs', forms=len(self.forms)):
+            stem = LCSFinder.multi_LCS([x.form for x in self.forms])
         affixes = []
         for form in self.forms:
             affix = form.find_affix(stem)
@@ -113,6 +162,8 @@ class Morpheme:
     То, что основы тоже отнесены к этому классу (с признаком isroot) — всё, что осталось
     от попыток выделять аффиксы несколько иначе, чем они выделяются в итоге.
     """
+    __slots__ = ('form', 'grammeme', 'isroot')
+
     def __init__(self, form: str, grammeme: Grammeme, isroot=False) -> None:
         self.form = form
         self.grammeme = grammeme
@@ -140,6 +191,7 @@ class Morpheme:
 
 class Paradigm:
     """Выделенная из лексемы основа и набор всех её словоизменительных аффиксов. """
+    __slots__ = ('stem', 'affixes', 'lemma_affix', 'lemma', 'parts', 'count', 'signature')
 
     def __init__(self, stem: str, affixes: list[Morpheme], lemma: str = "") -> None:
         common = affixes[0].grammeme
@@ -153,12 +205,10 @@ class Paradigm:
         self.lemma = lemma
         self.parts = len([x for x in stem.split("_") if x != ""])
         self.count = len(self.affixes)
+        self.signature = frozenset((a.form, a.grammeme) for a in local_affixes) # неизменяемый набор пар (аффикс, граммема)
 
     def __eq__(self, other):
-        selfaf = set(self.affixes)
-        otheraf = set(other.affixes)
-        result = selfaf.issubset(otheraf) or otheraf.issubset(selfaf)
-        return result
+        return self.signature <= other.signature or other.signature <= self.signature
     
     def __repr__(self) -> str:
         affixes = '\n'.join([x.__str__() for x in self.affixes])
@@ -167,38 +217,80 @@ class Paradigm:
 class Model:
     """Модель словоизменения, полученная по итогу обработки парадигм."""
 
-    def __init__(self, stems: list[Morpheme], affixes: list[Morpheme], name: str):
-        self.stems = stems
+    def __init__(self, stems: list[Morpheme], affixes: list[Morpheme], name: str, keep_stems: bool = True):
+        self.stems = []
         self.affixes = affixes
         self.name = name
         self.lemma = affixes[0]
-        self.parts = len([x for x in self.stems[0].form.split("_") if x != ""]) 
+        self.parts = len([x for x in stems[0].form.split("_") if x != ""]) 
         # ↑ by design у всех основ в модели одинаковая разрывность, так что можно проверить только первую
-        self.openness = [0] * self.parts
-        self.expressions = [''] * self.parts
-        for i in range(self.parts):
-            part_list = [stem.form.split("_")[i] for stem in self.stems]
-            self.openness[i], self.expressions[i] = find_regex(part_list)
-    
+        self.keep_stems = keep_stems # при False хранится только первая основа, а остальные учитываются лишь в счётчиках
+        self.stem_count = 0
+        self.part_counts = [Counter() for _ in range(self.parts)] # часть основы -> сколько основ модели её имеют
+        self.changed = True
+        for stem in stems:
+            self.add_stem(stem)
+
     @property
-    def power(self): return len(self.stems)
+    def power(self): return self.stem_count
 
     @property
     def size(self): return len(self.affixes)
+
+    @property
+    def openness(self) -> list[float]:
+        self.compare_stem_parts()
+        return self._openness
+
+    @property
+    def expressions(self) -> list[str]:
+        self.compare_stem_parts()
+        return self._expressions
     
     def __str__(self) -> str:
         stats = ''
         for p, regex in zip(self.openness, self.expressions):
             stats += f'{p}: {regex}\n'
-        return f"{self.name}: {len(self.stems)} stems\nVariables:\n{stats}"
+        return f"{self.name}: {self.stem_count} stems\nVariables:\n{stats}"
+
+    def add_stem(self, stem: Morpheme):
+        """Добавить основу: обновляются только счётчики частей, выражения пересчитываются при следующем обращении."""
+        if self.keep_stems or not self.stems:
+            self.stems.append(stem)
+        self.stem_count += 1
+        parts = stem.form.split("_")
+        for i in range(self.parts):
+            self.part_counts[i][parts[i]] += 1
+        self.changed = True
 
-    def add_stem(self, stem: str):
-        self.stems.append(stem)
+    def remove_stem(self, stem: Morpheme):
+        """Убрать основу, добавленную ранее через add_stem (например, если страница глагола изменилась)."""
+        for i, own in enumerate(self.stems):
+            if own.form == stem.form:
+                del self.stems[i]
+                break
+        self.stem_count -= 1
+        parts = stem.form.split("_")
+        for i in range(self.parts):
+            self.part_counts[i][parts[i]] -= 1
+            if not self.part_counts[i][parts[i]]:
+                del self.part_counts[i][parts[i]]
+        self.changed = True
     
     def compare_stem_parts(self):
+        if not self.changed:
+            return
+        self._openness = [0] * self.parts
+        self._expressions = [''] * self.parts
         for i in range(self.parts):
-            part_list = [stem.split("_")[i] for stem in self.stems]
-            self.openness[i], self.expressions[i] = find_regex(part_list)
+            with stage('regex', stems=len(self.part_counts[i])):
+                self._openness[i], self._expressions[i] = find_regex(self.part_counts[i])
+        self.changed = False
+
+    def stem_patterns(self) -> list[tuple[set[str], set[str] | None]]:
+        """Выражения частей основы в виде наборов строк (см. fliss.find_pattern) — для прямой сборки преобразователя."""
+        with stage('regex', parts=len(self.part_counts)):
+            return [find_pattern(counts) for counts in self.part_counts]
 
     def export(self, folder):
         with open(folder + '\\' + self.stems[0] + '[{}]'.format(len(self.stems)) + ".txt", "w", encoding="utf8") as fout: 
@@ -206,37 +298,139 @@ class Model:
             fout.write('Stems: ' + ', '.join(self.stems) + '\n\n')
             [fout.write(a.grammeme + ' # ' + a.form + '\n') for a in self.affixes]
 
+class AffixIndex:
+    """
+    Инвертированный индекс: пара (аффикс, граммема) -> сигнатуры парадигм, где она встречается.
+    Позволяет найти все сигнатуры, которые являются подмножеством или надмножеством данной
+    (то есть совпадающие с ней парадигмы и дефектные варианты), не сравнивая её со всеми подряд.
+    """
+    def __init__(self):
+        self.postings = {}
+
+    def add(self, signature: frozenset):
+        for key in signature:
+            self.postings.setdefault(key, set()).add(signature)
+
+    def remove(self, signature: frozenset):
+        for key in signature:
+            self.postings[key].discard(signature)
+
+    def related(self, signature: frozenset) -> list[frozenset]:
+        """
+        Сигнатуры из индекса, сравнимые с данной по включению. За один проход по спискам индекса считаем,
+        сколько общих пар у каждой сигнатуры с данной: если столько же, сколько в ней самой, — это подмножество,
+        если столько же, сколько в данной, — надмножество.
+        """
+        shared = {}
+        for key in signature:
+            for other in self.postings.get(key, ()):
+                shared[other] = shared.get(other, 0) + 1
+        return [other for other, count in shared.items() if count == len(other) or count == len(signature)]
+
 def create_models(paradigms: list[Paradigm]):
     """
     Обобщить список парадигм до моделей спряжения.
-    Суть такова: создаётся пустой список, куда мы будем складывать модели, и ещё один, куда мы будем
-    складывать номера парадигм, для которых мы уже нашли модель. Бежим по списку парадигм.
-    Для каждой свежевзятой парадигмы проверяем, есть ли её номер в списке обработанных. Убедившись, что 
-    его там нет, создаём под неё новую модель, копируя туда аффиксы этой парадигмы
-    и кладя её основу в список основ модели. Затем смотрим на все парадигмы в списке после нынешней и
-    сравниваем их с нынешней, если их номеров нет в списке виденных. Если нашли совпадение, 
-    добавляем в текущую модель новую основу, а в список виденных — новый номер.
-    Добравшись до конца списка парадигм, кладём модель в список и берёмся за следующую парадигму.
+    Суть такова: бежим по списку парадигм, и каждая парадигма, ещё не попавшая ни в одну модель, открывает
+    новую модель со своими аффиксами и своей основой. В эту модель сразу же забираются основы всех следующих
+    по списку свободных парадигм, чей набор аффиксов совпадает с набором открывшей модель парадигмы, 
+    содержит его или содержится в нём. Так модель получает все свои основы, а мы берёмся за следующую парадигму.
+    Чтобы не сравнивать каждую парадигму с каждой, парадигмы с одинаковой сигнатурой собираются в группы,
+    а подходящие группы ищутся по инвертированному индексу AffixIndex. Группа, отданная модели, 
+    из индекса удаляется целиком: все её парадигмы идут по списку позже текущей.
     """
+    groups = {}
+    for i, paradigm in enumerate(paradigms):
+        groups.setdefault(paradigm.signature, []).append(i)
+    index = AffixIndex()
+    for signature in groups:
+        index.add(signature)
+
     models = []
-    seen = []
-    for i in range(len(paradigms)):
-        if i not in seen:
-            stems = [paradigms[i].stem]
-            for j in range(i + 1, len(paradigms)):
-                if j not in seen:
-                    if paradigms[i] == paradigms[j]:
-                        stems.append(paradigms[j].stem)
-                        seen.append(j)
-            models.append(Model(stems, paradigms[i].affixes, paradigms[i].lemma))
+    seen = set()
+    for i, paradigm in enumerate(paradigms):
+        if i in seen:
+            continue
+        own = groups[paradigm.signature]
+        own.remove(i) # номер текущей парадигмы всегда первый в своей группе: все меньшие уже разобраны
+        members = []
+        for signature in index.related(paradigm.signature):
+            members.extend(groups[signature])
+            groups[signature] = []
+            index.remove(signature)
+        members.sort()
+        seen.update(members)
+        stems = [paradigm.stem] + [paradigms[j].stem for j in members]
+        models.append(Model(stems, paradigm.affixes, paradigm.lemma))
     return models
 
-def demacronize(word: str):
-    word = word.replace('ā', 'a-').replace('ē', 'e-').replace('ī', 'i-')
-    word = word.replace('ō', 'o-').replace('ū', 'u-').replace('ȳ', 'y-')
-    return word
+class ModelInducer:
+    """
+    Потоковое обобщение парадигм до моделей (см. induce_models), которое можно продолжить позже:
+    объект сохраняется вместе с моделями, и в него можно добавлять новые парадигмы или убирать прежние.
+    Для парадигм, добавленных с именем источника (файла), запоминается, в какую модель ушла основа.
+    Модель, из которой убрали все основы, остаётся в списке как None, чтобы номера остальных не сдвигались.
+    Убрать можно только основу, без которой остальные парадигмы разошлись бы по моделям так же: открывшую
+    модель парадигму — лишь вместе со всей моделью (см. opened), иначе модели нужно собрать заново.
+    """
+
+    def __init__(self, keep_stems: bool = False):
+        self.keep_stems = keep_stems
+        self.index = AffixIndex() # только сигнатуры открывших модели парадигм (у двух моделей они совпасть не могут)
+        self.seeds = {} # сигнатура открывшей парадигмы -> номер модели
+        self.signatures = [] # номер модели -> сигнатура открывшей её парадигмы
+        self.models = []
+        self.openers = [] # номер модели -> источник открывшей её парадигмы
+        self.sources = {} # источник -> (номер модели, основа)
+
+    def add(self, paradigm: Paradigm, source: str | None = None) -> int:
+        """Отдать парадигму самой ранней модели, чья открывшая парадигма сравнима с ней, или открыть новую. Возвращает номер модели."""
+        with stage('cluster'):
+            related = self.index.related(paradigm.signature)
+            if related:
+                number = min(self.seeds[signature] for signature in related)
+                self.models[number].add_stem(paradigm.stem)
+            else:
+                number = len(self.models)
+                self.seeds[paradigm.signature] = number
+                self.signatures.append(paradigm.signature)
+                self.openers.append(source)
+                self.index.add(paradigm.signature)
+                self.models.append(Model([paradigm.stem], paradigm.affixes, paradigm.lemma, self.keep_stems))
+        if source is not None:
+            self.sources[source] = (number, paradigm.stem)
+        return number
+
+    def opened(self, source: str) -> bool:
+        """
+        Открыла ли парадигма источника модель, в которой есть и другие основы. Без неё эти основы и все
+        следующие парадигмы сравнивались бы с другими открывшими, так что remove здесь не поможет.
+        """
+        number, _ = self.sources[source]
+        return self.openers[number] == source and self.models[number].power > 1
+
+    def remove(self, source: str) -> int:
+        """Убрать основу, пришедшую из источника. Возвращает номер затронутой модели."""
+        if self.opened(source):
+            raise ValueError(f'{source}: парадигма открыла модель с другими основами, модели нужно собрать заново')
+        number, stem = self.sources.pop(source)
+        model = self.models[number]
+        model.remove_stem(stem)
+        if model.power == 0:
+            self.models[number] = None
+            self.index.remove(self.signatures[number])
+            del self.seeds[self.signatures[number]]
+        return number
 
-def remacronize(word: str):
-    word = word.replace('a-', 'ā').replace('e-', 'ē').replace('i-', 'ī')
-    word = word.replace('o-', 'ō').replace('u-', 'ū').replace('y-', 'ȳ')
-    return word
\ No newline at end of file
+def induce_models(paradigms, keep_stems: bool = False) -> list[Model]:
+    """
+    Потоковый вариант create_models: парадигмы берутся из любого итератора по одной и сразу
+    отдаются модели или открывают новую, а сами парадигмы после этого не хранятся.
+    Парадигма попадает в самую раннюю модель, чья открывшая парадигма сравнима с ней по включению сигнатур,
+    — ровно туда же, куда её отправил бы create_models, поэтому и модели получаются те же.
+    В индексе лежат только сигнатуры открывших модели парадигм, так что память растёт с числом моделей,
+    а не лексем. При keep_stems=False модель хранит лишь первую основу, а остальные учитывает в счётчиках частей.
+    """
+    inducer = ModelInducer(keep_stems)
+    for paradigm in paradigms:
+        inducer.add(paradigm)
+    return inducer.models
\ No newline at end of file
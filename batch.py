@@ -0,0 +1,156 @@
+"""
+Пакетный разбор: слова читаются потоком из файлов или со стандартного ввода (по одному или несколько через пробел
+в строке), для каждого пишется одна запись с его разборами в формате JSONL или TSV.
+Повторяющиеся слова разбираются один раз: результаты хранятся в ограниченном LRU-кэше, а слово, которое ещё
+разбирается в одной из порций, следующие порции ждут оттуда же и в пул не отправляют. Разборы держатся
+записями macrons.Analysis, и макроны леммы восстанавливаются только при записи в файл.
+При -j больше 1 порции слов разбираются в пуле процессов; в работе одновременно держится лишь несколько порций,
+так что корпус не читается в память целиком.
+
+    python batch.py corpus.txt -o analyses.jsonl -j 4
+    cat corpus.txt | python batch.py --format tsv
+"""
+
+import argparse
+import json
+import sys
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from lookup import load_analyzer
+from macrons import Analysis, analyses, demacronize_all
+
+analyzer = None # анализатор процесса-исполнителя, открывается один раз в init_worker
+
+def init_worker(path):
+    global analyzer
+    analyzer = load_analyzer(path)
+
+def analyze_words(words: list[str]) -> list[list[Analysis]]:
+    """Разборы списка слов анализатором текущего процесса: для каждого слова — записи Analysis без повторов."""
+    return [analyses(analyzer, w) for w in demacronize_all(words)]
+
+def read_words(paths: list[str]):
+    for path in paths:
+        fin = sys.stdin if path == '-' else open(path, encoding='utf8')
+        try:
+            for line in fin:
+                yield from line.split()
+        finally:
+            if fin is not sys.stdin:
+                fin.close()
+
+def chunked(words, size: int):
+    chunk = []
+    for w in words:
+        chunk.append(w)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class ResultCache:
+    """Ограниченный кэш разборов: при переполнении забывается слово, к которому дольше всего не обращались."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = 0
+
+    def get(self, word):
+        if word in self.items:
+            self.items.move_to_end(word)
+            self.hits += 1
+            return self.items[word]
+        return None
+
+    def put(self, word, analyses):
+        self.items[word] = analyses
+        if len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+class Portion:
+    """Порция в работе: слова, отправленные на разбор, и их разборы, когда порция готова."""
+
+    def __init__(self, todo: list[str], result):
+        self.todo = todo
+        self.result = result # Future в пуле или уже готовый список
+        self.found = None
+
+    def resolve(self) -> dict:
+        if self.found is None:
+            self.found = dict(zip(self.todo, self.result if isinstance(self.result, list) else self.result.result()))
+        return self.found
+
+def analyze_stream(words, path: str | None = None, workers: int = 1, chunk_size: int = 2000, cache_size: int = 100000):
+    """
+    Пары (слово, разборы) в порядке входа. В каждой порции разбираются только слова, которых нет ни в кэше,
+    ни в порциях, ещё стоящих в работе; в пуле одновременно обрабатывается не больше 2 * workers порций.
+    """
+    cache = ResultCache(cache_size)
+    pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(path,)) if workers > 1 else None
+    if pool is None:
+        init_worker(path)
+    pending = deque()
+    inflight = {} # слово -> порция в работе, где оно разбирается
+
+    def submit(chunk):
+        known, todo = {}, []
+        for w in chunk:
+            if w in known:
+                continue
+            # разборы из кэша берутся сразу: пока порция в работе, слово может из него выпасть
+            source = inflight.get(w) or cache.get(w)
+            if source is None:
+                todo.append(w)
+            known[w] = source
+        portion = Portion(todo, pool.submit(analyze_words, todo) if pool else analyze_words(todo))
+        for w in todo:
+            inflight[w] = portion
+        pending.append((chunk, known, portion))
+
+    def finish():
+        chunk, known, portion = pending.popleft()
+        found = portion.resolve()
+        for w in portion.todo:
+            del inflight[w]
+        for w in chunk:
+            source = known[w]
+            # порции завершаются по очереди, так что порция, где разбиралось слово, уже готова
+            analyses = found[w] if source is None else source.resolve()[w] if isinstance(source, Portion) else source
+            cache.put(w, analyses)
+            yield w, analyses
+
+    try:
+        for chunk in chunked(words, chunk_size):
+            submit(chunk)
+            if len(pending) >= 2 * max(workers, 1):
+                yield from finish()
+        while pending:
+            yield from finish()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def write_record(out, word: str, found: list[Analysis], fmt: str):
+    if fmt == 'jsonl':
+        record = {'word': word, 'analyses': [{'lemma': a.display_lemma, 'grammeme': a.grammeme} for a in found]}
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    else:
+        out.write(word + '\t' + ';'.join(f'{a.display_lemma}[{a.grammeme}]' for a in found) + '\n')
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Пакетный разбор латинских словоформ.')
+    argparser.add_argument('inputs', nargs='*', default=['-'], help='файлы со словами (по умолчанию — стандартный ввод)')
+    argparser.add_argument('-o', '--output', default='-', help='файл для записей (по умолчанию — стандартный вывод)')
+    argparser.add_argument('--format', choices=['jsonl', 'tsv'], default='jsonl')
+    argparser.add_argument('--fst', default=None, help='файл анализатора (по умолчанию latest_FST.lvfst или latest_FST.pkl)')
+    argparser.add_argument('-j', '--workers', type=int, default=1, help='число процессов')
+    argparser.add_argument('--chunk', type=int, default=2000, help='слов в порции')
+    argparser.add_argument('--cache', type=int, default=100000, help='сколько разных слов держать в кэше')
+    args = argparser.parse_args()
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf8')
+    with out:
+        for word, found in analyze_stream(read_words(args.inputs), args.fst, args.workers, args.chunk, args.cache):
+            write_record(out, word, found, args.format)
@@ -0,0 +1,147 @@
+"""
+Замеры скорости по этапам конвейера, каждый отдельно: чтение страниц (TableExtractor, как в read_html),
+выделение основ (multi_LCS), обобщение парадигм до моделей (create_models), поиск выражений основ (find_regex),
+компиляция преобразователя аффиксов (define_affix) с приписыванием $letter+ и поиск разборов (Analyzer.apply).
+По умолчанию корпус — синтетический (synthetic.py) заданного размера во временной папке, так что замеры
+воспроизводимы и без папки Verbs; можно указать и настоящую папку. Итоги пишутся в JSON, и с --compare
+прогон сравнивается с прошлым: этапы, ставшие медленнее допуска, печатаются, а код выхода становится 1.
+
+    python bench.py -n 300 -o bench_results.json
+    python bench.py -n 300 --compare bench_results.json --stages html lcs lookup
+    python bench.py --folder Verbs -n 100
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from fliss import find_regex
+from LCS import make_finder
+from Morphology import Lexeme, create_models, demacronize
+from parse import TableExtractor, list_files, spans_to_forms
+from synthetic import write_corpus
+
+STAGES = ['html', 'lcs', 'cluster', 'regex', 'compile', 'lookup']
+
+def measure(run, repeat: int = 1) -> float:
+    """Лучшее из repeat время выполнения run() в секундах."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def read_pages(paths: list[str]) -> list[list]:
+    """Словоформы каждой страницы (пустой список, если латинской таблицы нет)."""
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as fin:
+            spans = TableExtractor().extract(io.TextIOWrapper(io.BytesIO(fin.read()), encoding='utf8'))
+        pages.append(spans_to_forms(spans) if spans is not None else [])
+    return pages
+
+def run_benchmarks(paths: list[str], stages: list[str], repeat: int = 1, workers: int | None = 1, lcs_backend: str = 'bit') -> dict:
+    """Замеры выбранных этапов. Входные данные этапа готовятся предыдущими этапами вне замера."""
+    results = {}
+
+    def record(stage, seconds, items, **sizes):
+        results[stage] = {'seconds': seconds, 'items': items, 'per_second': items / seconds if seconds else 0.0, **sizes}
+        print(f"{stage}: {seconds:.3f} с, {items} шт., {results[stage]['per_second']:.0f} в секунду")
+
+    if 'html' in stages:
+        record('html', measure(lambda: read_pages(paths), repeat), len(paths))
+    pages = [forms for forms in read_pages(paths) if forms]
+    words = [[demacronize(x.form) for x in forms] for forms in pages]
+
+    if 'lcs' in stages:
+        record('lcs', measure(lambda: [make_finder(lcs_backend).multi_LCS(w) for w in words], repeat), len(words))
+    if not set(stages) & {'cluster', 'regex', 'compile', 'lookup'}:
+        return results
+    paradigms = [Lexeme(forms).extract_paradigm() for forms in pages]
+
+    if 'cluster' in stages:
+        record('cluster', measure(lambda: create_models(paradigms), repeat), len(paradigms))
+    models = create_models(paradigms)
+    if 'regex' in stages:
+        counts = [part for model in models for part in model.part_counts]
+        record('regex', measure(lambda: [find_regex(part) for part in counts], repeat), len(counts), models=len(models))
+    if not set(stages) & {'compile', 'lookup'}:
+        return results
+
+    from Foma import attach_letters, define_affix
+    fsm = None
+
+    def compile_all():
+        nonlocal fsm
+        fsm = attach_letters(define_affix(models, workers))
+    seconds = measure(compile_all, repeat if 'compile' in stages else 1)
+    if 'compile' in stages:
+        record('compile', seconds, len(models), states=len(fsm))
+
+    if 'lookup' in stages:
+        from lookup import Analyzer
+        analyzer = Analyzer(fsm)
+        sample = [w for forms in words for w in forms]
+        analyses = 0
+
+        def lookup_all():
+            nonlocal analyses
+            analyses = sum(1 for w in sample for _ in analyzer.apply(w))
+        record('lookup', measure(lookup_all, repeat), len(sample), analyses_per_word=analyses / max(len(sample), 1))
+    return results
+
+def compare(current: dict, previous: dict, tolerance: float) -> list[str]:
+    """Этапы, которые стали медленнее прошлого прогона больше чем на долю tolerance."""
+    slower = []
+    for stage, result in current['stages'].items():
+        old = previous.get('stages', {}).get(stage)
+        if old is None or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        print(f"{stage}: {old['seconds']:.3f} с -> {result['seconds']:.3f} с (x{ratio:.2f})")
+        if ratio > 1 + tolerance:
+            slower.append(stage)
+    return slower
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Замеры скорости по этапам построения и работы анализатора.')
+    argparser.add_argument('-n', '--count', type=int, default=200, help='число страниц')
+    argparser.add_argument('--folder', default=None, help='папка с настоящими страницами (по умолчанию — синтетический корпус)')
+    argparser.add_argument('--seed', default=0, help='зерно синтетического корпуса и порядка страниц')
+    argparser.add_argument('--defective', type=float, default=0.05, help='доля пропущенных клеток в синтетических таблицах')
+    argparser.add_argument('--stages', nargs='*', default=STAGES, choices=STAGES)
+    argparser.add_argument('--repeat', type=int, default=1, help='сколько раз повторить каждый замер (берётся лучший)')
+    argparser.add_argument('-j', '--workers', type=int, default=1, help='число процессов для компиляции моделей')
+    argparser.add_argument('--lcs-backend', default='bit', help='реализация НОП (см. LCS.BACKENDS)')
+    argparser.add_argument('-o', '--output', default='bench_results.json', help='файл для итогов')
+    argparser.add_argument('--compare', default=None, help='итоги прошлого прогона для сравнения')
+    argparser.add_argument('--tolerance', type=float, default=0.2, help='допустимое замедление этапа (доля)')
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.folder:
+            paths = list_files(args.folder, args.seed)[:args.count]
+        else:
+            paths = write_corpus(folder, args.count, args.seed, args.defective)
+        stages = run_benchmarks(paths, args.stages, args.repeat, args.workers, args.lcs_backend)
+    current = {
+        'meta': {'pages': len(paths), 'corpus': args.folder or 'synthetic', 'seed': args.seed, 'repeat': args.repeat,
+                 'workers': args.workers, 'python': platform.python_version(), 'machine': platform.machine(),
+                 'time': time.strftime('%Y-%m-%d %H:%M:%S')},
+        'stages': stages,
+    }
+    slower = []
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare, encoding='utf8') as fin:
+            slower = compare(current, json.load(fin), args.tolerance)
+    with open(args.output, 'w', encoding='utf8') as outp:
+        json.dump(current, outp, ensure_ascii=False, indent=1)
+    if slower:
+        print(f"Медленнее прошлого прогона: {', '.join(slower)}")
+        sys.exit(1)
@@ -0,0 +1,92 @@
+"""
+Кэш разобранного корпуса в базе SQLite. Для каждого html-файла хранятся словоформы его латинской таблицы
+(тройки "форма, лемма, граммема") и выделенная из них парадигма. Запись привязана к размеру, времени
+изменения и хэшу содержимого файла: если файл не менялся, повторные запуски не разбирают его вовсе,
+а если изменился — запись обновляется при следующем чтении.
+"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import Morphology
+
+VERSION = 'corpus-v2' # меняется, если меняется способ выделения парадигм; старые парадигмы тогда забываются
+
+SCHEMA = '''
+create table if not exists meta (key text primary key, value text);
+create table if not exists files (name text primary key, size integer, mtime integer, sha256 text, error text);
+create table if not exists forms (name text, position integer, form text, lemma text, grammeme text, primary key (name, position));
+create table if not exists paradigms (name text primary key, data blob);
+'''
+
+class CorpusCache:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute('pragma journal_mode=wal') # читатели не ждут писателей из других процессов
+        self.db.executescript(SCHEMA)
+        row = self.db.execute("select value from meta where key = 'version'").fetchone()
+        if row is None or row[0] != VERSION:
+            with self.db:
+                self.db.execute('delete from paradigms')
+                self.db.execute("insert or replace into meta values ('version', ?)", (VERSION,))
+
+    def lookup(self, path: str, contents: bytes | None = None) -> tuple | None:
+        """
+        Запись о файле, если она ещё верна: (error или None, отпечаток файла — размер, время изменения, sha256).
+        Размер и время изменения сверяются сразу; если время изменилось, а размер нет, сверяется хэш содержимого,
+        и при совпадении запись остаётся в силе.
+        """
+        name = os.path.basename(path)
+        row = self.db.execute('select size, mtime, sha256, error from files where name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        stat = os.stat(path)
+        if (row[0], row[1]) == (stat.st_size, stat.st_mtime_ns):
+            return row[3], (row[0], row[1], row[2])
+        if row[0] != stat.st_size:
+            return None
+        if contents is None:
+            with open(path, 'rb') as inp:
+                contents = inp.read()
+        if hashlib.sha256(contents).hexdigest() != row[2]:
+            return None
+        with self.db:
+            self.db.execute('update files set mtime = ? where name = ?', (stat.st_mtime_ns, name))
+        return row[3], (row[0], stat.st_mtime_ns, row[2])
+
+    def store(self, path: str, contents: bytes, forms: list[Morphology.WordForm] | None, error: str | None = None):
+        """Запомнить словоформы файла (или ошибку) вместе с отпечатком файла; старая парадигма забывается."""
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        with self.db:
+            self.db.execute('delete from forms where name = ?', (name,))
+            self.db.execute('delete from paradigms where name = ?', (name,))
+            self.db.execute('insert or replace into files values (?, ?, ?, ?, ?)',
+                            (name, stat.st_size, stat.st_mtime_ns, hashlib.sha256(contents).hexdigest(), error))
+            self.db.executemany('insert into forms values (?, ?, ?, ?, ?)',
+                                [(name, i, w.form, w.lemma, repr(w.grammeme)) for i, w in enumerate(forms or [])])
+
+    def forms(self, path: str) -> list[Morphology.WordForm]:
+        """Словоформы файла в порядке таблицы, каждый раз новыми объектами (Lexeme меняет их формы)."""
+        rows = self.db.execute('select form, lemma, grammeme from forms where name = ? order by position',
+                               (os.path.basename(path),))
+        return [Morphology.WordForm(form, lemma, Morphology.Grammeme(grammeme.split('|'))) for form, lemma, grammeme in rows]
+
+    def paradigm(self, path: str) -> Morphology.Paradigm | None:
+        row = self.db.execute('select data from paradigms where name = ?', (os.path.basename(path),)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def store_paradigm(self, path: str, paradigm: Morphology.Paradigm):
+        with self.db:
+            self.db.execute('insert or replace into paradigms values (?, ?)',
+                            (os.path.basename(path), pickle.dumps(paradigm, pickle.HIGHEST_PROTOCOL)))
+
+open_caches = {} # кэши, уже открытые в этом процессе
+
+def open_cache(path: str) -> CorpusCache:
+    if path not in open_caches:
+        open_caches[path] = CorpusCache(path)
+    return open_caches[path]
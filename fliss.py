@@ -1,39 +1,139 @@
 """
 Find Logic In String Set (FLISS) — поиск регулярного выражения, описывающего набор строк.
+Набор можно задать списком строк или счётчиком Counter (строка -> сколько раз встретилась):
+результат зависит только от того, какие строки встретились и сколько раз, так что модель может копить
+счётчики по мере поступления основ и не хранить сами основы.
+Строки складываются в префиксный (или, для суффиксов, обратный) бор, и выражение выписывается по нему
+с вынесенными общими частями: вместо (am|amb|aud) получается a(m(b)?|ud). Язык выражения тот же,
+ветви упорядочены, так что текст выражения от запуска к запуску не меняется.
 """
 
-def find_regex(strings: list[str], threshold=0.05):
-    p = fliss(strings)
+from collections import Counter
+
+def as_counts(strings) -> Counter:
+    return strings if isinstance(strings, Counter) else Counter(strings)
+
+def find_regex(strings: list[str] | Counter, threshold=0.05, factored=True):
+    counts = as_counts(strings)
+    p = fliss(counts)
     if p > threshold:
-        p1, prefix = trimming_fliss(strings, 'p', threshold)
-        p2, suffix = trimming_fliss(strings, 's', threshold)
+        p1, prefix = trimming_fliss(counts, 'p', threshold, factored)
+        p2, suffix = trimming_fliss(counts, 's', threshold, factored)
         return min(p1, p2), prefix + '.' + suffix
     else:
-        return p, union(strings)
+        return p, union(counts, factored)
+
+def trimming_fliss(strings: list[str] | Counter, mode: str, threshold=0.05, factored=True):
+    """
+    Укорачивать строки на символ с конца (mode='p', остаются начала) или с начала (mode='s', остаются концы),
+    пока вероятность увидеть новую строку не упадёт до порога. Возвращает вероятность и выражение для укороченных строк.
+    """
+    counts = as_counts(strings)
+    p, depth, root = trimming_depth(counts, mode, threshold)
+    if factored:
+        return p, trie_regex(root, reverse=(mode == 's'), depth=depth)
+    return p, union(cut(counts, mode, depth), factored)
 
-def trimming_fliss(strings: list[str], mode: str, threshold=0.05):
+def trimming_depth(counts: Counter, mode: str, threshold=0.05) -> tuple[float, int, dict]:
+    """
+    Длина, до которой trimming_fliss укорачивает строки, вероятность при ней и бор строк. Число разных строк
+    при каждой длине считается по уровням бора: узлы на глубине длины плюс строки, которые короче её.
+    Так все длины перебираются за один проход, без пересборки набора строк на каждом шаге.
+    """
+    if mode not in ('p', 's'):
+        raise Exception("Error: no such mode for fliss")
+    root = trie(counts, reverse=(mode == 's'))
+    nodes, ends = trie_levels(root)
+    shorter = [0] # shorter[d] — сколько разных строк короче d
+    for n in ends:
+        shorter.append(shorter[-1] + n)
+    total = sum(counts.values())
     p = 1
-    while p > threshold and max(strings) != '':
-        max_len = max([len(x) for x in strings])
-        if mode == 'p':
-            strings = [x[:max_len-1]for x in strings]
-        elif mode == 's':
-            strings = [x[:-max_len:-1][::-1]for x in strings]
-        else:
-            raise Exception("Error: no such mode for fliss")
-        p = fliss(strings)
-    return p, union(strings)
-
-def fliss(strings: list[str]):
-    seen = set(strings)
-    p_unseen = (1 - 1 / (len(seen) + 1) ) ** len(strings)
+    depth = len(nodes) - 1 # длина самой длинной строки
+    while p > threshold and depth > 0:
+        depth -= 1
+        p = (1 - 1 / (nodes[depth] + shorter[depth] + 1) ) ** total
+    return p, depth, root
+
+def cut(counts: Counter, mode: str, depth: int) -> Counter:
+    """Строки, укороченные до depth символов: начала при mode='p', концы при mode='s'."""
+    result = Counter()
+    for x, n in counts.items():
+        result[x[:depth] if mode == 'p' else x[len(x) - min(len(x), depth):]] += n
+    return result
+
+def find_pattern(strings: list[str] | Counter, threshold=0.05) -> tuple[set[str], set[str] | None]:
+    """
+    То же решение, что в find_regex, но в виде наборов строк, а не текста выражения: (строки, None),
+    если набор описывается перечислением, или (начала, концы), если между ними стоит wildcard-символ.
+    По нему преобразователь можно построить напрямую, без разбора регулярного выражения.
+    """
+    counts = as_counts(strings)
+    if fliss(counts) > threshold:
+        _, prefix_depth, _ = trimming_depth(counts, 'p', threshold)
+        _, suffix_depth, _ = trimming_depth(counts, 's', threshold)
+        return set(cut(counts, 'p', prefix_depth)), set(cut(counts, 's', suffix_depth))
+    return set(counts), None
+
+def fliss(strings: list[str] | Counter):
+    counts = as_counts(strings)
+    p_unseen = (1 - 1 / (len(counts) + 1) ) ** sum(counts.values())
     return p_unseen
 
-def union(strings: list[str]):
-    uniques = set(strings)
+def trie(strings: list[str] | Counter, reverse=False) -> dict:
+    """Бор строк: узел — словарь "символ -> узел", ключ '' есть у узлов, где кончается строка."""
+    root = {}
+    for string in as_counts(strings):
+        node = root
+        for ch in (reversed(string) if reverse else string):
+            node = node.setdefault(ch, {})
+        node[''] = True
+    return root
+
+def trie_levels(root: dict) -> tuple[list[int], list[int]]:
+    """Сколько узлов бора и сколько концов строк на каждой глубине."""
+    nodes, ends = [], []
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth == len(nodes):
+            nodes.append(0)
+            ends.append(0)
+        nodes[depth] += 1
+        for ch, child in node.items():
+            if ch:
+                stack.append((child, depth + 1))
+            else:
+                ends[depth] += 1
+    return nodes, ends
+
+def trie_regex(node: dict, reverse=False, depth: int | None = None) -> str:
+    """
+    Выражение для строк бора с вынесенными общими началами (или концами при reverse=True).
+    Ветви идут по алфавиту; если в узле кончается строка, а ветви продолжаются, они помечаются как необязательные.
+    depth — обрезать строки до этой длины.
+    """
+    if depth == 0:
+        return ''
+    branches = []
+    for ch in sorted(ch for ch in node if ch):
+        rest = trie_regex(node[ch], reverse, None if depth is None else depth - 1)
+        branches.append(rest + ch if reverse else ch + rest)
+    if not branches:
+        return ''
+    if '' in node:
+        return f'({'|'.join(branches)})?'
+    if len(branches) == 1:
+        return branches[0]
+    return f'({'|'.join(branches)})'
+
+def union(strings: list[str] | Counter, factored=True):
+    uniques = as_counts(strings)
     if len(uniques) == 0:
         return ''
     elif len(uniques) == 1:
-        return strings[0]
+        return next(iter(uniques))
+    elif factored:
+        return trie_regex(trie(uniques))
     else:
-        return f'({'|'.join(uniques)})'
\ No newline at end of file
+        return f'({'|'.join(sorted(uniques))})'
\ No newline at end of file
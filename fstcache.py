@@ -0,0 +1,99 @@
+"""
+Дисковый кэш скомпилированных преобразователей отдельных моделей.
+Ключ — хэш от всего, из чего строится преобразователь модели: регулярных выражений основы,
+аффикса леммы и набора аффиксов с граммемами. Неизменившиеся модели при повторной сборке
+не компилируются заново. Так же хранятся и промежуточные объединения дерева слияния (ключ узла — хэш ключей
+его детей), поэтому после изменения нескольких моделей пересобираются только узлы над ними.
+Размер кэша ограничен; при переполнении удаляются давно не использованные записи. Общий размер папки
+считается один раз при открытии и дальше ведётся в памяти, так что папка перебирается только при вытеснении.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from pyfoma import FST
+from Morphology import Model
+
+FORMAT = 'fst-v2' # меняется, если меняется способ построения преобразователя по модели
+EMPTY = 'empty' # ключ пустого преобразователя: на этом месте была модель, из которой убрали все основы
+
+def model_key(model: Model) -> str:
+    """Стабильный (не зависящий от запуска) хэш модели."""
+    content = [
+        FORMAT,
+        model.expressions,
+        [model.lemma.form, repr(model.lemma.grammeme)],
+        [[a.form, repr(a.grammeme)] for a in model.affixes],
+    ]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode('utf8')).hexdigest()
+
+def node_key(left: str, right: str) -> str:
+    """Ключ узла дерева объединений — хэш от ключей двух его детей, так что узел определяется своим содержимым."""
+    return hashlib.sha256(json.dumps([FORMAT, 'union', left, right]).encode('utf8')).hexdigest()
+
+class FstCache:
+    """Папка с файлами <ключ>.pkl. Время изменения файла служит отметкой последнего использования."""
+
+    def __init__(self, folder: str, max_bytes: int = 1 << 30):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+        self.total = sum(size for _, size, _ in self.entries())
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key + '.pkl')
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def get(self, key: str) -> FST | None:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as inp:
+                fst = pickle.load(inp)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return fst
+
+    def put(self, key: str, fst: FST):
+        path = self.path(key)
+        temp = path + f'.{os.getpid()}.tmp'
+        with open(temp, 'wb') as outp:
+            pickle.dump(fst, outp, pickle.HIGHEST_PROTOCOL)
+            size = outp.tell()
+        try:
+            self.total -= os.path.getsize(path) # запись под тем же ключом заменяется
+        except OSError:
+            pass
+        os.replace(temp, path) # запись атомарна: читатель видит либо старый файл, либо целый новый
+        self.total += size
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        """Записи папки: (время последнего использования, размер, имя файла)."""
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.folder, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        """
+        Удалять давно не использованные записи, пока кэш не уложится в 90% предела (чтобы следующие записи
+        не вызывали перебор папки каждая); заодно уточняется общий размер.
+        """
+        entries = self.entries()
+        self.total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if self.total <= self.max_bytes * 0.9:
+                break
+            os.remove(os.path.join(self.folder, name))
+            self.total -= size
@@ -0,0 +1,223 @@
+"""
+Компактный двоичный формат преобразователя вместо pickle-файла с объектами pyfoma.
+Файл состоит из плоских массивов: таблица символов, таблица состояний (начало списка переходов
+и финальный вес каждого состояния) и массивы переходов (входной символ, выходной символ, цель, вес). Следом лежат готовые таблицы поиска
+lookup.Analyzer (плотные номера входных символов и границы переходов каждой пары "состояние + символ"),
+чтобы процессы, открывшие файл, не строили их каждый у себя. Файл открывается через mmap и не разбирается в объекты Python: поиск идёт прямо по массивам,
+а страницы файла операционная система делит между всеми процессами, которые его открыли.
+
+Запуск модуля переводит pickle-файл в новый формат:
+    python fstfile.py latest_FST.pkl latest_FST.lvfst
+"""
+
+import mmap
+import os
+import pickle
+import struct
+from array import array
+from pyfoma import FST
+
+MAGIC_V1 = b'LVFST1\0\0' # без таблиц поиска; такие файлы ещё открываются
+MAGIC = b'LVFST2\0\0'
+HEADER = struct.Struct('<8sIIIIII') # метка, состояний, переходов, символов, начальное состояние, байт в таблице символов, ширина таблиц поиска
+HEADER_V1 = struct.Struct('<8sIIIII')
+NONFINAL = float('inf')
+
+def align(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+def flatten(fst: FST):
+    """
+    Перенумеровать состояния и символы преобразователя pyfoma и разложить его по массивам.
+    Состояния нумеруются обходом в ширину от начального, переходы каждого состояния сортируются
+    по входному символу, так что их можно искать двоичным поиском. Символ 0 — пустая строка (эпсилон).
+    """
+    labels = set(fst.alphabet)
+    for state in fst.states:
+        for label, _ in state.all_transitions():
+            labels.update(label)
+    symbols = [''] + sorted(labels - {''})
+    symbol_ids = {sym: i for i, sym in enumerate(symbols)}
+
+    order = [fst.initialstate]
+    numbers = {fst.initialstate: 0}
+    for state in order:
+        for _, t in sorted(state.all_transitions(), key=lambda x: x[0]):
+            if t.targetstate not in numbers:
+                numbers[t.targetstate] = len(order)
+                order.append(t.targetstate)
+
+    offsets, finals = array('I', [0]), array('d')
+    inputs, outputs, targets, weights = array('I'), array('I'), array('I'), array('d')
+    for state in order:
+        arcs = []
+        for label, t in state.all_transitions():
+            arcs.append((symbol_ids[label[0]], symbol_ids[label[-1]], numbers[t.targetstate], t.weight))
+        for arc in sorted(arcs):
+            inputs.append(arc[0])
+            outputs.append(arc[1])
+            targets.append(arc[2])
+            weights.append(arc[3])
+        offsets.append(len(inputs))
+        finals.append(state.finalweight if state in fst.finalstates else NONFINAL)
+    in_alphabet = array('B', [sym in fst.alphabet for sym in symbols])
+    return symbols, in_alphabet, offsets, finals, inputs, outputs, targets, weights
+
+def lookup_tables(n_symbols: int, offsets, inputs) -> tuple[array, int, array, array]:
+    """
+    Таблицы поиска lookup.Analyzer: dense[символ] — плотный номер входного символа (0 — эпсилон, -1 — символ,
+    которого нет на входе переходов), width — число плотных номеров, а starts[состояние * width + номер] ..
+    ends[...] — переходы состояния по символу (переходы уже отсортированы по входному символу).
+    """
+    used = sorted({inputs[arc] for arc in range(len(inputs))} - {0})
+    dense = array('i', [-1]) * n_symbols
+    dense[0] = 0
+    for code, sym in enumerate(used, 1):
+        dense[sym] = code
+    width = len(used) + 1
+    n_states = len(offsets) - 1
+    starts = array('i', [0]) * (n_states * width)
+    ends = array('i', [0]) * (n_states * width)
+    for state in range(n_states):
+        for arc in range(offsets[state], offsets[state+1]):
+            cell = state * width + dense[inputs[arc]]
+            if ends[cell] == 0:
+                starts[cell] = arc
+            ends[cell] = arc + 1
+    return dense, width, starts, ends
+
+def export(fst: FST, path: str):
+    """Записать преобразователь в двоичный формат."""
+    symbols, in_alphabet, offsets, finals, inputs, outputs, targets, weights = flatten(fst)
+    encoded = [sym.encode('utf8') for sym in symbols]
+    symbol_offsets = array('I', [0])
+    for sym in encoded:
+        symbol_offsets.append(symbol_offsets[-1] + len(sym))
+    blob = b''.join(encoded)
+    dense, width, starts, ends = lookup_tables(len(symbols), offsets, inputs)
+    sections = [symbol_offsets, in_alphabet, blob, offsets, finals, inputs, outputs, targets, weights, dense, starts, ends]
+    with open(path + '.tmp', 'wb') as outp:
+        outp.write(HEADER.pack(MAGIC, len(finals), len(inputs), len(symbols), 0, len(blob), width))
+        for section in sections:
+            data = section if isinstance(section, bytes) else section.tobytes()
+            outp.write(data)
+            outp.write(b'\0' * (align(len(data)) - len(data)))
+    os.replace(path + '.tmp', path)
+
+class MappedFST:
+    """
+    Преобразователь, открытый из двоичного файла через mmap. Массивы — это срезы memoryview
+    поверх отображённого файла, так что открытие не зависит от размера преобразователя,
+    а в памяти процесса создаётся только таблица символов. tables — таблицы поиска из файла
+    (dense, width, starts, ends, как у lookup_tables) или None у файлов старого формата.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as inp:
+            self.map = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        magic = bytes(view[:len(MAGIC)])
+        if magic == MAGIC:
+            _, n_states, n_arcs, n_symbols, self.initial, blob_size, width = HEADER.unpack_from(view)
+            pos = HEADER.size
+        elif magic == MAGIC_V1:
+            _, n_states, n_arcs, n_symbols, self.initial, blob_size = HEADER_V1.unpack_from(view)
+            pos = HEADER_V1.size
+        else:
+            raise Exception(f"Error: {path} is not a transducer file")
+
+        def section(size, fmt=None):
+            nonlocal pos
+            part = view[pos:pos+size]
+            pos += align(size)
+            return part.cast(fmt) if fmt else part
+
+        symbol_offsets = section(4 * (n_symbols + 1), 'I')
+        in_alphabet = section(n_symbols, 'B')
+        blob = section(blob_size)
+        self.offsets = section(4 * (n_states + 1), 'I')
+        self.finals = section(8 * n_states, 'd')
+        self.inputs = section(4 * n_arcs, 'I')
+        self.outputs = section(4 * n_arcs, 'I')
+        self.targets = section(4 * n_arcs, 'I')
+        self.weights = section(8 * n_arcs, 'd')
+        self.tables = None
+        if magic == MAGIC:
+            dense = section(4 * n_symbols, 'i')
+            self.tables = (dense, width, section(4 * n_states * width, 'i'), section(4 * n_states * width, 'i'))
+
+        self.symbols = [bytes(blob[symbol_offsets[i]:symbol_offsets[i+1]]).decode('utf8') for i in range(n_symbols)]
+        self.symbol_ids = {sym: i for i, sym in enumerate(self.symbols)}
+        self.alphabet = {sym for sym, flag in zip(self.symbols, in_alphabet) if flag}
+        self.max_symbol = max((len(sym) for sym in self.alphabet), default=1)
+        self.wildcard = self.symbol_ids.get('.', -1)
+
+    def __len__(self):
+        return len(self.finals)
+
+    def tokenize_against_alphabet(self, word: str) -> list[str]:
+        """Разбиение строки на символы так же, как в pyfoma: на каждом шаге берётся самый длинный символ алфавита."""
+        tokens = []
+        start = 0
+        while start < len(word):
+            t = word[start]
+            for length in range(1, min(self.max_symbol, len(word) - start) + 1):
+                if word[start:start + length] in self.alphabet:
+                    t = word[start:start + length]
+            tokens.append(t)
+            start += len(t)
+        return tokens
+
+    def arcs(self, state: int, symbol: int) -> range:
+        """Номера переходов из state по входному символу symbol (двоичный поиск по отсортированным переходам)."""
+        low, high = self.offsets[state], self.offsets[state+1]
+        start = low
+        while start < high:
+            mid = (start + high) // 2
+            if self.inputs[mid] < symbol:
+                start = mid + 1
+            else:
+                high = mid
+        end = start
+        while end < self.offsets[state+1] and self.inputs[end] == symbol:
+            end += 1
+        return range(start, end)
+
+    def apply(self, word: str):
+        """Все выходы преобразователя для строки word, как у FST.apply в pyfoma (порядок может отличаться)."""
+        tokens = self.tokenize_against_alphabet(word)
+        codes = [self.symbol_ids[t] if t in self.alphabet else self.wildcard for t in tokens]
+        stack = [(self.initial, 0, ())]
+        while stack:
+            state, pos, output = stack.pop()
+            if pos == len(codes) and self.finals[state] != NONFINAL:
+                yield ''.join(output)
+            for arc in self.arcs(state, 0):
+                stack.append((self.targets[arc], pos, output + (self.symbols[self.outputs[arc]],)))
+            if pos < len(codes) and codes[pos] >= 0:
+                for arc in self.arcs(state, codes[pos]):
+                    out = self.symbols[self.outputs[arc]]
+                    if codes[pos] == self.wildcard and out == '.':
+                        out = tokens[pos]
+                    stack.append((self.targets[arc], pos + 1, output + (out,)))
+
+def load(path: str):
+    """Открыть анализатор: двоичный файл через mmap или, для файлов .pkl, объект pyfoma из pickle."""
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as inp:
+            return pickle.load(inp)
+    return MappedFST(path)
+
+def default_path(folder: str = '.') -> str:
+    """latest_FST.lvfst, если он есть и не старше latest_FST.pkl, иначе latest_FST.pkl."""
+    binary, pickled = os.path.join(folder, 'latest_FST.lvfst'), os.path.join(folder, 'latest_FST.pkl')
+    if os.path.exists(binary) and (not os.path.exists(pickled) or os.path.getmtime(binary) >= os.path.getmtime(pickled)):
+        return binary
+    return pickled
+
+if __name__ == '__main__':
+    import sys
+    source, target = sys.argv[1], sys.argv[2]
+    export(load(source), target)
+    print(f"{source} -> {target}: {os.path.getsize(source)} -> {os.path.getsize(target)} байт")
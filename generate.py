@@ -0,0 +1,156 @@
+"""
+Порождение форм по лемме и граммеме через обращённый анализатор: на вход ему подаётся "лемма + символ граммемы",
+на выходе — словоформы. Запрос — строка "лемма<TAB>граммема" (одна клетка) или просто "лемма" (вся парадигма).
+Какие граммемы есть в парадигме, берётся из таблиц аффиксов моделей (latest_models.pkl): подходят модели,
+чья форма леммы кончается так же, как запрошенная лемма, и поиск идёт только по их граммемам, а не по всем.
+Леммы без макронов (как в "Latin verbs.txt") тоже годятся: макроны конца леммы восстанавливаются по записи леммы моделей.
+Ответы кэшируются, запросы обрабатываются порциями (при -j больше 1 — в пуле процессов), строки сразу пишутся в файл.
+
+    python generate.py "Latin verbs.txt" -o paradigms.tsv -j 4
+    echo "amō	1|s|pres|act|ind" | python generate.py
+"""
+
+import argparse
+import json
+import pickle
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Foma import STATE, load_state
+from Morphology import Model, demacronize, remacronize
+from batch import ResultCache, chunked
+from lexicon import plain
+from lookup import Analyzer
+
+class Generator:
+    """
+    Таблицы обращённого анализатора (fst обращается на месте) и индекс по концам лемм моделей:
+    конец без макронов -> конец в записи модели -> граммемы её аффиксов.
+    """
+
+    def __init__(self, fst, models: list[Model | None]):
+        self.analyzer = Analyzer(fst.invert())
+        self.index = {}
+        for model in models:
+            if model is None:
+                continue
+            ending = model.lemma.form.split('_')[-1]
+            grams = self.index.setdefault(plain(ending), {}).setdefault(ending, {})
+            for affix in model.affixes:
+                grams[repr(affix.grammeme)] = None
+        self.longest = max((len(ending) for ending in self.index), default=0)
+        self.cache = ResultCache(100000)
+
+    def variants(self, lemma: str) -> dict[str, list[str]]:
+        """
+        Записи леммы, которые стоит искать, и граммемы моделей, которые могут дать каждую из них.
+        У леммы без макронов (как в "Latin verbs.txt") макроны конца берутся из записи леммы подходящей модели.
+        """
+        lemma = demacronize(lemma)
+        bare = plain(lemma)
+        found = {}
+        for length in range(min(self.longest, len(bare)) + 1):
+            for ending, grams in self.index.get(bare[len(bare) - length:], {}).items():
+                variant = lemma if '-' in lemma else bare[:len(bare) - length] + ending
+                found.setdefault(variant, {}).update(grams)
+        return {variant: list(grams) for variant, grams in found.items()}
+
+    def search(self, variant: str, gram: str) -> list[str]:
+        """Словоформы для записи леммы (с "-" вместо макронов) и граммемы, без повторов; ответы кэшируются."""
+        key = (variant, gram)
+        found = self.cache.get(key)
+        if found is None:
+            found = list(dict.fromkeys(remacronize(form) for form in self.analyzer.apply(f'{variant}\t{gram}')))
+            self.cache.put(key, found)
+        return found
+
+    def forms(self, lemma: str, gram: str) -> list[str]:
+        """Словоформы клетки gram (с макронами)."""
+        found = {}
+        for variant, grams in self.variants(lemma).items():
+            if gram in grams:
+                found.update(dict.fromkeys(self.search(variant, gram)))
+        return list(found)
+
+    def paradigm(self, lemma: str) -> list[tuple[str, list[str]]]:
+        """Все клетки, в которых для леммы нашлись формы: пары (граммема, формы) в порядке таблиц моделей."""
+        cells = {}
+        for variant, grams in self.variants(lemma).items():
+            for gram in grams:
+                cells.setdefault(gram, {}).update(dict.fromkeys(self.search(variant, gram)))
+        return [(gram, list(forms)) for gram, forms in cells.items() if forms]
+
+generator = None # генератор процесса-исполнителя, создаётся один раз в init_worker
+
+def init_worker(fst_path: str, state_path: str):
+    global generator
+    with open(fst_path, 'rb') as inp:
+        fst = pickle.load(inp)
+    generator = Generator(fst, load_state(state_path)['inducer'].models)
+
+def generate_requests(requests: list[tuple[str, str | None]]) -> list[list[tuple[str, list[str]]]]:
+    """Ответы на порцию запросов: для запроса (лемма, граммема) — одна клетка, для (лемма, None) — вся парадигма."""
+    results = []
+    for lemma, gram in requests:
+        if gram is None:
+            results.append(generator.paradigm(lemma))
+        else:
+            forms = generator.forms(lemma, gram)
+            results.append([(gram, forms)] if forms else [])
+    return results
+
+def read_requests(paths: list[str]):
+    for path in paths:
+        fin = sys.stdin if path == '-' else open(path, encoding='utf8')
+        try:
+            for line in fin:
+                fields = line.strip().split('\t')
+                if fields[0]:
+                    yield fields[0], fields[1] if len(fields) > 1 and fields[1] else None
+        finally:
+            if fin is not sys.stdin:
+                fin.close()
+
+def generate_stream(requests, fst_path: str = 'latest_FST.pkl', state_path: str = STATE, workers: int = 1, chunk_size: int = 200):
+    """Пары (запрос, клетки) в порядке входа; в пуле одновременно обрабатывается не больше 2 * workers порций."""
+    pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(fst_path, state_path)) if workers > 1 else None
+    if pool is None:
+        init_worker(fst_path, state_path)
+    pending = deque()
+    try:
+        for chunk in chunked(requests, chunk_size):
+            pending.append((chunk, pool.submit(generate_requests, chunk) if pool else generate_requests(chunk)))
+            if len(pending) >= 2 * max(workers, 1):
+                chunk, result = pending.popleft()
+                yield from zip(chunk, result.result() if pool else result)
+        while pending:
+            chunk, result = pending.popleft()
+            yield from zip(chunk, result.result() if pool else result)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def write_rows(out, lemma: str, cells: list[tuple[str, list[str]]], fmt: str):
+    if fmt == 'jsonl':
+        record = {'lemma': lemma, 'cells': [{'grammeme': gram, 'forms': forms} for gram, forms in cells]}
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    else:
+        for gram, forms in cells:
+            for form in forms:
+                out.write(f'{lemma}\t{gram}\t{form}\n')
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Порождение латинских глагольных форм по леммам.')
+    argparser.add_argument('inputs', nargs='*', default=['-'], help='файлы запросов "лемма" или "лемма<TAB>граммема" (по умолчанию — стандартный ввод)')
+    argparser.add_argument('-o', '--output', default='-', help='файл для строк (по умолчанию — стандартный вывод)')
+    argparser.add_argument('--format', choices=['tsv', 'jsonl'], default='tsv')
+    argparser.add_argument('--fst', default='latest_FST.pkl', help='анализатор (pickle-файл pyfoma)')
+    argparser.add_argument('--state', default=STATE, help='модели последней сборки')
+    argparser.add_argument('-j', '--workers', type=int, default=1, help='число процессов')
+    argparser.add_argument('--chunk', type=int, default=200, help='запросов в порции')
+    args = argparser.parse_args()
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf8')
+    with out:
+        for (lemma, _), cells in generate_stream(read_requests(args.inputs), args.fst, args.state, args.workers, args.chunk):
+            write_rows(out, lemma, cells, args.format)
@@ -0,0 +1,198 @@
+"""
+Замеры этапов сборки: время (по часам и процессорное), насколько этап поднял пиковую память процесса и,
+по желанию, число объектов Python и пик памяти tracemalloc для каждого этапа — чтения таблиц, выделения основы,
+обобщения до моделей, поиска выражений, компиляции каждой модели, каждой детерминизации и минимизации, записи pickle.
+Пик этапа учитывает и вложенные в него этапы, так что пик compile — это пик всей компиляции модели.
+Размеры преобразователей (состояния и переходы) записываются ещё и рядом отметок во времени, так что видно,
+на каком слиянии или на какой модели сборка раздувается. Всё это выгружается в JSON (export), а при profile=True
+рядом сохраняется и профиль cProfile.
+
+По умолчанию замеры выключены, и stage() почти ничего не стоит. Включаются они через enable()
+(в Foma.py — ключом --trace). В процессах пула замеры делаются так же: задача, обёрнутая в remote(),
+возвращает вместе с результатом свои события, а unwrap() переносит их в основной процесс.
+"""
+
+import cProfile
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+class Tracer:
+    """События этапов и отметки размеров одного процесса."""
+
+    def __init__(self):
+        self.enabled = False
+        self.options = {}
+        self.events = [] # словари: этап, начало, длительность, процессорное время, память и сведения этапа
+        self.samples = [] # (время, имя, значение); время везде — time.time(), чтобы события процессов пула легли на одну ось
+        self.depth = 0
+        self.peaks = [] # для каждого открытого этапа с tracemalloc — наибольший пик уже закрытых вложенных этапов
+        self.profiler = None
+        self.pid = os.getpid()
+
+    def enable(self, profile=False, memory=False, objects=False):
+        self.enabled = True
+        self.options = {'profile': profile, 'memory': memory, 'objects': objects}
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile and self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def adopt(self):
+        """
+        В процессе пула, порождённом через fork, — забыть события и профиль, унаследованные от основного процесса,
+        иначе они вернутся в него второй раз.
+        """
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.events, self.samples = [], []
+            self.depth = 0
+            self.peaks = []
+            if self.profiler is not None:
+                self.profiler.disable()
+                self.profiler = None
+
+    def drain(self) -> tuple[list, list]:
+        events, samples = self.events, self.samples
+        self.events, self.samples = [], []
+        return events, samples
+
+tracer = Tracer()
+
+def enable(profile=False, memory=False, objects=False):
+    """Включить замеры: profile — профиль cProfile, memory — память по tracemalloc, objects — число объектов Python."""
+    tracer.enable(profile, memory, objects)
+
+def peak_rss() -> int:
+    """Пиковый размер процесса в байтах (0, если узнать нельзя)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+@contextmanager
+def stage(name: str, **info):
+    """
+    Замер этапа. Сведения этапа (например, размеры преобразователя) можно дополнить внутри блока:
+        with stage('determinize', states=len(fst)) as info:
+            ...
+            info['states_after'] = len(result)
+    """
+    if not tracer.enabled:
+        yield info
+        return
+    options = tracer.options
+    if options['memory']:
+        # пик объемлющего этапа до сброса переносится в его запись, иначе вложенный этап его бы стёр
+        if tracer.peaks:
+            tracer.peaks[-1] = max(tracer.peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        tracer.peaks.append(0)
+    objects = len(gc.get_objects()) if options['objects'] else None
+    tracer.depth += 1
+    wall, cpu = time.perf_counter(), time.process_time()
+    started, rss = time.time(), peak_rss()
+    try:
+        yield info
+    finally:
+        process_peak = peak_rss()
+        event = {'stage': name, 'pid': os.getpid(), 'depth': tracer.depth, 'start': started,
+                 'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu,
+                 'peak_rss_growth': process_peak - rss, 'process_peak_rss': process_peak}
+        tracer.depth -= 1
+        if options['memory']:
+            peak = max(tracemalloc.get_traced_memory()[1], tracer.peaks.pop())
+            if tracer.peaks:
+                tracer.peaks[-1] = max(tracer.peaks[-1], peak)
+            event['traced_peak'] = peak
+        if objects is not None:
+            event['objects'] = len(gc.get_objects()) - objects
+        event.update(info)
+        tracer.events.append(event)
+
+def sample(name: str, value):
+    """Отметка величины во времени (например, числа состояний после очередного слияния)."""
+    if tracer.enabled:
+        tracer.samples.append((time.time(), name, value))
+
+def fst_size(fst) -> dict:
+    """Число состояний и переходов преобразователя pyfoma."""
+    return {'states': len(fst.states), 'transitions': sum(len(arcs) for s in fst.states for arcs in s.transitions.values())}
+
+def note_size(info: dict, fst, suffix: str = ''):
+    """Дописать в сведения этапа размер преобразователя (только при включённых замерах) и отметить число состояний."""
+    if tracer.enabled:
+        size = fst_size(fst)
+        info.update({key + suffix: value for key, value in size.items()})
+        sample('states', size['states'])
+
+class Traced:
+    """Результат задачи из процесса пула вместе с событиями, записанными в этом процессе."""
+
+    def __init__(self, result, events: list, samples: list):
+        self.result = result
+        self.events = events
+        self.samples = samples
+
+class Remote:
+    """Задача для пула, которая включает замеры в процессе-исполнителе и возвращает Traced."""
+
+    def __init__(self, func, options: dict):
+        self.func = func
+        self.options = options
+
+    def __call__(self, *args):
+        tracer.adopt()
+        if not tracer.enabled:
+            tracer.enable(False, self.options['memory'], self.options['objects'])
+        result = self.func(*args)
+        return Traced(result, *tracer.drain())
+
+def remote(func):
+    """func как есть, если замеры выключены, иначе — обёртка Remote для отправки в пул."""
+    return Remote(func, tracer.options) if tracer.enabled else func
+
+def unwrap(value):
+    """Результат задачи; события из процесса-исполнителя переносятся в замеры основного процесса."""
+    if isinstance(value, Traced):
+        tracer.events += value.events
+        tracer.samples += value.samples
+        return value.result
+    return value
+
+def pool_map(pool, func, items):
+    """map(func, items) в текущем процессе или в пуле; замеры из процессов пула переносятся в основной."""
+    if pool is None:
+        return map(func, items)
+    return map(unwrap, pool.map(remote(func), items))
+
+def summary() -> dict:
+    """Итоги по этапам: сколько раз, суммарное и наибольшее время, суммарное процессорное время."""
+    totals = {}
+    for event in tracer.events:
+        total = totals.setdefault(event['stage'], {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'max_wall': 0.0})
+        total['count'] += 1
+        total['wall'] += event['wall']
+        total['cpu'] += event['cpu']
+        total['max_wall'] = max(total['max_wall'], event['wall'])
+    return totals
+
+def export(path: str):
+    """Записать замеры в JSON; при включённом профиле рядом пишется <path без расширения>.prof."""
+    with open(path, 'w', encoding='utf8') as outp:
+        json.dump({'options': tracer.options, 'summary': summary(), 'events': tracer.events,
+                   'samples': [{'time': t, 'name': name, 'value': value} for t, name, value in tracer.samples]},
+                  outp, ensure_ascii=False, indent=1)
+    if tracer.profiler is not None:
+        tracer.profiler.disable()
+        tracer.profiler.dump_stats(os.path.splitext(path)[0] + '.prof')
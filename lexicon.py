@@ -0,0 +1,129 @@
+"""
+Анализатор, ограниченный словарём лемм. Общий анализатор принимает любую основу $letter+, поэтому на каждую форму
+выдаёт десятки пар "лемма + граммема", большей частью для несуществующих лемм. Здесь выход анализатора
+сверяется со словарём: леммами из списка "Latin verbs.txt" (без макронов) и леммами обучающих таблиц
+(из latest_models.pkl). Словарь хранится бором, и поиск по таблицам анализатора идёт вместе с проходом по бору:
+выход пути читается по бору по мере того, как путь его пишет, и путь обрывается, как только выход перестаёт быть
+началом словарной леммы. Это композиция анализатора со словарём, но выполненная только для разбираемого слова, —
+целиком её строить не нужно (для объединения $letter+ с бором тысяч лемм она вышла бы огромной).
+
+Словарь сохраняется отдельным файлом рядом с latest_FST.pkl и открывается через lookup.load_analyzer:
+
+    python lexicon.py                       # собрать latest_FST.lexicon
+    python lexicon.py --check words.txt     # сверить разборы с отфильтрованной выдачей общего анализатора
+"""
+
+import argparse
+import os
+import time
+from Morphology import ModelInducer
+from fstfile import default_path
+from lookup import Analyzer
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+LEXICON = os.path.join(dir_path, 'Latin verbs.txt')
+DONE = {} # узел бора после символа граммемы: дальше выход продолжаться не может
+
+def plain(lemma: str) -> str:
+    """Лемма без знаков макрона: так леммы записаны в "Latin verbs.txt"."""
+    return lemma.replace('-', '')
+
+def read_lexicon(path: str = LEXICON) -> set[str]:
+    """Леммы из списка, по одной в строке. Составные (gratias ago) пропускаются: анализатор разбирает отдельные слова."""
+    with open(path, encoding='utf8') as fin:
+        return {line.strip().lower() for line in fin if line.strip() and ' ' not in line.strip()}
+
+def trained_lemmas(inducer: ModelInducer) -> set[str]:
+    """Леммы обучающих таблиц: основа, перемежающаяся с частями аффикса леммы своей модели."""
+    lemmas = set()
+    for number, stem in inducer.sources.values():
+        model = inducer.models[number]
+        if model is None:
+            continue
+        parts, affix = stem.form.split('_'), model.lemma.form.split('_')
+        lemmas.add(plain(''.join(p + a for p, a in zip(parts, affix)) + ''.join(affix[len(parts):])))
+    return lemmas
+
+class LexiconAnalyzer:
+    """Таблицы общего анализатора (lookup.Analyzer) и бор словарных лемм; разборы — только со словарными леммами."""
+
+    def __init__(self, analyzer: Analyzer, lemmas: set[str]):
+        self.analyzer = analyzer
+        self.lemmas = lemmas
+        self.trie = {}
+        for lemma in lemmas:
+            node = self.trie
+            for ch in lemma:
+                node = node.setdefault(ch, {})
+            node[''] = DONE
+
+    def __len__(self):
+        return len(self.analyzer)
+
+    def apply(self, word: str):
+        # поиск общего анализатора, который ведёт вместе с путём узел бора, до которого дошёл выход
+        return self.analyzer.apply(word, step, self.trie, done)
+
+    def first(self, word: str, k: int = 1) -> list[str]:
+        """Не больше k разных разборов; поиск останавливается, как только они найдены."""
+        found = []
+        for analysis in self.apply(word):
+            if analysis not in found:
+                found.append(analysis)
+                if len(found) == k:
+                    break
+        return found
+
+def step(node: dict, out: str) -> dict | None:
+    """Узел бора после выходного символа out или None, если выход перестал быть началом словарной леммы."""
+    if not out or out == '-': # эпсилон и знак макрона не двигают по бору
+        return node
+    if node is DONE:
+        return None
+    if out[0] == '\t':
+        return node.get('')
+    return node.get(out)
+
+def done(node: dict) -> bool:
+    """Выход пути — целая словарная лемма с граммемой."""
+    return node is DONE
+
+def save(lemmas: set[str], path: str = 'latest_FST.lexicon'):
+    with open(path, 'w', encoding='utf8') as outp:
+        outp.write('\n'.join(sorted(lemmas)) + '\n')
+
+def load(path: str = 'latest_FST.lexicon', fst: str | None = None) -> LexiconAnalyzer:
+    """Словарь из path и анализатор из fst (по умолчанию — latest_FST.lvfst / latest_FST.pkl из той же папки)."""
+    from fstfile import load as load_fst
+    return LexiconAnalyzer(Analyzer(load_fst(fst or default_path(os.path.dirname(path) or '.'))), read_lexicon(path))
+
+def check(words: list[str], constrained: LexiconAnalyzer):
+    """Разборы должны совпасть с разборами общего анализатора, у которых лемма есть в словаре."""
+    whole = constrained.analyzer
+    for w in words:
+        expected = {x for x in whole.apply(w) if plain(x.split('\t')[0]) in constrained.lemmas}
+        if set(constrained.apply(w)) != expected:
+            raise Exception(f"Error: analyses differ for {w}")
+    for name, analyzer in [('общий', whole), ('по словарю', constrained)]:
+        start = time.perf_counter()
+        count = sum(1 for w in words for _ in analyzer.apply(w))
+        print(f"{name}: {len(words) / (time.perf_counter() - start):.0f} слов/с, разборов на слово: {count / max(len(words), 1):.1f}")
+
+if __name__ == '__main__':
+    from Foma import STATE, load_state
+    from Morphology import demacronize
+    argparser = argparse.ArgumentParser(description='Сборка словаря лемм для ограниченного анализатора.')
+    argparser.add_argument('--lexicon', default=LEXICON, help='список лемм, по одной в строке')
+    argparser.add_argument('--state', default=STATE, help='модели последней сборки (их леммы добавляются к словарю)')
+    argparser.add_argument('-o', '--output', default='latest_FST.lexicon')
+    argparser.add_argument('--check', default=None, help='файл со словами для сверки с общим анализатором')
+    args = argparser.parse_args()
+
+    lemmas = read_lexicon(args.lexicon)
+    if os.path.exists(args.state):
+        lemmas |= trained_lemmas(load_state(args.state)['inducer'])
+    save(lemmas, args.output)
+    print(f"Лемм в словаре: {len(lemmas)}")
+    if args.check:
+        with open(args.check, encoding='utf8') as fin:
+            check([demacronize(w) for line in fin for w in line.split()], load(args.output))
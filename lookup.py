@@ -0,0 +1,156 @@
+"""
+Быстрый поиск разборов по готовому преобразователю вместо FST.apply из pyfoma.
+Преобразователь (объект pyfoma или файл .lvfst) один раз переводится в целочисленные таблицы:
+входные символы перенумеровываются подряд (буквы, дефис макрона в записи a-/e-, символ "."),
+и для каждой пары "состояние + символ" в таблице лежат границы её переходов.
+Поиск идёт явным стеком, без кучи и без копирования выходной строки на каждом шаге,
+а разборы выдаются по одному по мере нахождения.
+
+Запуск модуля сравнивает скорость с pyfoma и проверяет, что разборы совпадают:
+    python lookup.py [файл со словами]
+"""
+
+import os
+import pickle
+import sys
+import time
+from collections import Counter
+from fstfile import MappedFST, NONFINAL, default_path, flatten, load, lookup_tables
+
+class Analyzer:
+    """
+    Таблицы переходов преобразователя и поиск по ним. apply(word) выдаёт те же строки, что и FST.apply.
+    У преобразователя из файла .lvfst (MappedFST) таблицы поиска, цели и выходы переходов не копируются:
+    это срезы отображённого файла, и процессы пула, открывшие один файл, делят их страницы.
+    """
+
+    def __init__(self, fst):
+        if isinstance(fst, MappedFST):
+            symbols, alphabet = fst.symbols, fst.alphabet
+            finals, inputs, outputs, targets = fst.finals, fst.inputs, fst.outputs, fst.targets
+            tables = fst.tables or lookup_tables(len(symbols), fst.offsets, inputs)
+        else:
+            symbols, in_alphabet, offsets, finals, inputs, outputs, targets, _ = flatten(fst)
+            alphabet = {sym for sym, flag in zip(symbols, in_alphabet) if flag}
+            tables = lookup_tables(len(symbols), offsets, inputs)
+        dense, self.width, self.starts, self.ends = tables
+
+        # символ алфавита, который не встречается на входе переходов, ни с чем не совпадает (-1), а неизвестный — это "."
+        self.codes = {sym: -1 for sym in alphabet}
+        self.codes.update({sym: dense[i] for i, sym in enumerate(symbols) if dense[i] > 0 and sym in alphabet})
+        self.wildcard = self.codes.get('.', -1)
+        self.alphabet = alphabet
+        self.long_starts = {sym[0] for sym in alphabet if len(sym) > 1} # первые буквы многобуквенных символов
+        self.max_symbol = max((len(sym) for sym in alphabet), default=1)
+
+        self.symbols = symbols
+        self.targets = targets
+        self.outputs = outputs # номера выходных символов переходов
+        # выход "." у перехода по "." копирует входной символ
+        self.copy = symbols.index('.') if '.' in symbols else -1
+        self.finals = finals
+        self.initial = 0
+
+    def __len__(self):
+        return len(self.finals)
+
+    def tokenize(self, word: str) -> list[str]:
+        """Разбиение строки на символы алфавита (самый длинный подходящий символ, как в pyfoma)."""
+        tokens = []
+        start = 0
+        while start < len(word):
+            t = word[start]
+            if t in self.long_starts:
+                for length in range(2, min(self.max_symbol, len(word) - start) + 1):
+                    if word[start:start + length] in self.alphabet:
+                        t = word[start:start + length]
+            tokens.append(t)
+            start += len(t)
+        return tokens
+
+    def apply(self, word: str, step=None, start=None, accept=None):
+        """
+        Разборы слова по одному. Вместе с путём можно вести своё состояние (так lexicon.py идёт по бору лемм):
+        step(узел, выходной символ) даёт узел после перехода или None, и тогда путь обрывается; start — узел
+        в начале поиска, а разбор выдаётся, только если accept(узел) истинно.
+        """
+        tokens = self.tokenize(word)
+        codes = [self.codes.get(t, self.wildcard) for t in tokens]
+        n, width, wildcard, copy = len(codes), self.width, self.wildcard, self.copy
+        starts, ends, targets, outputs, symbols, finals = self.starts, self.ends, self.targets, self.outputs, self.symbols, self.finals
+        # состояние, позиция во входе, выход как связный список (символ, предыдущий) и узел step
+        stack = [(self.initial, 0, None, start)]
+        while stack:
+            state, pos, path, node = stack.pop()
+            if pos == n and finals[state] != NONFINAL and (accept is None or accept(node)):
+                yield render(path)
+            cell = state * width
+            if step is None:
+                for arc in range(starts[cell], ends[cell]):
+                    stack.append((targets[arc], pos, (symbols[outputs[arc]], path), None))
+            else:
+                for arc in range(starts[cell], ends[cell]):
+                    out = symbols[outputs[arc]]
+                    if (child := step(node, out)) is not None:
+                        stack.append((targets[arc], pos, (out, path), child))
+            if pos < n and codes[pos] > 0:
+                code = codes[pos]
+                cell += code
+                for arc in range(starts[cell], ends[cell]):
+                    out = outputs[arc]
+                    out = tokens[pos] if out == copy and code == wildcard else symbols[out]
+                    if step is None:
+                        stack.append((targets[arc], pos + 1, (out, path), None))
+                    elif (child := step(node, out)) is not None:
+                        stack.append((targets[arc], pos + 1, (out, path), child))
+
+def render(path) -> str:
+    parts = []
+    while path is not None:
+        parts.append(path[0])
+        path = path[1]
+    return ''.join(reversed(parts))
+
+def load_analyzer(path: str | None = None) -> Analyzer:
+    """
+    Открыть анализатор из latest_FST.lvfst / latest_FST.pkl (см. fstfile.default_path) или из указанного файла.
+    Файл .shards — анализатор, разбитый на части по концам аффиксов (shards.py), файл .lexicon — словарь лемм
+    для анализатора из той же папки (lexicon.py).
+    """
+    if path is not None and path.endswith('.shards'):
+        import shards
+        return shards.load(path)
+    if path is not None and path.endswith('.lexicon'):
+        import lexicon
+        return lexicon.load(path)
+    return Analyzer(load(path or default_path()))
+
+def benchmark(words: list[str], path: str = 'latest_FST.pkl', repeat: int = 3):
+    """Сравнить время разбора списка слов через pyfoma и через Analyzer и убедиться, что разборы совпадают."""
+    with open(path, 'rb') as inp:
+        fst = pickle.load(inp)
+    start = time.perf_counter()
+    analyzer = Analyzer(fst)
+    print(f"Таблицы построены за {time.perf_counter() - start:.3f} с, состояний: {len(analyzer)}")
+    for w in words:
+        if Counter(fst.apply(w)) != Counter(analyzer.apply(w)):
+            raise Exception(f"Error: analyses differ for {w}")
+    for name, apply in [('pyfoma', fst.apply), ('Analyzer', analyzer.apply)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for w in words:
+                for _ in apply(w):
+                    pass
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {repeat * len(words) / elapsed:.0f} слов/с")
+
+if __name__ == '__main__':
+    from Morphology import demacronize
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf8') as fin:
+            words = [demacronize(line.strip()) for line in fin if line.strip()]
+    else:
+        stems = ['am', 'laud', 'port', 'mon', 'hab', 'leg', 'aud', 'cap']
+        endings = ['o-', 'a-s', 'at', 'a-mus', 'a-bam', 'a-re', 'e-s', 'et', 'unt', 'or', 'a-tur', 'i-', 'isse', 'a-vi-', 'ui-']
+        words = [stem + ending for stem in stems for ending in endings]
+    benchmark(words, os.path.join(os.path.dirname(os.path.realpath(__file__)), 'latest_FST.pkl'))
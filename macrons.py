@@ -0,0 +1,75 @@
+"""
+Перевод между записью с макронами (ā) и записью анализатора с дефисом после гласной (a-).
+Отдельное слово без макронов (только ASCII) или без дефиса возвращается сразу, без единой замены; остальные
+переводятся цепочкой str.replace — в CPython это быстрее и str.translate со словарём, и регулярного выражения.
+Варианты *_all переводят список слов разом: список склеивается, и цепочка замен проходит по нему один раз,
+так что число вызовов не зависит от длины списка. Здесь же — запись разбора Analysis: лемма в записи анализатора
+и интернированная граммема. Макроны леммы восстанавливаются только при выводе (str(analysis) или
+analysis.display_lemma), так что при сравнении разборов с эталоном лемма ни разу не переводится.
+"""
+
+import sys
+from typing import NamedTuple
+
+LONG = [('ā', 'a-'), ('ē', 'e-'), ('ī', 'i-'), ('ō', 'o-'), ('ū', 'u-'), ('ȳ', 'y-')]
+
+def demacronize_text(text: str) -> str:
+    for long, plain in LONG:
+        text = text.replace(long, plain)
+    return text
+
+def remacronize_text(text: str) -> str:
+    for long, plain in LONG:
+        text = text.replace(plain, long)
+    return text
+
+def demacronize(word: str) -> str:
+    return word if word.isascii() else demacronize_text(word)
+
+def remacronize(word: str) -> str:
+    return remacronize_text(word) if '-' in word else word
+
+def translate_all(words: list[str], convert) -> list[str]:
+    """convert для каждого слова списка одним проходом по склеенной строке (слова — без переводов строки)."""
+    if not words:
+        return []
+    joined = '\n'.join(words)
+    if joined.count('\n') != len(words) - 1:
+        return [convert(w) for w in words]
+    return convert(joined).split('\n')
+
+def demacronize_all(words: list[str]) -> list[str]:
+    return translate_all(words, demacronize)
+
+def remacronize_all(words: list[str]) -> list[str]:
+    return translate_all(words, remacronize)
+
+class Analysis(NamedTuple):
+    """Разбор: лемма в записи анализатора (с "-" вместо макронов) и граммема (интернированная строка)."""
+    lemma: str
+    grammeme: str
+
+    @property
+    def display_lemma(self) -> str:
+        return remacronize(self.lemma)
+
+    def __str__(self):
+        return f'{self.display_lemma}\t{self.grammeme}'
+
+PARSED = {} # строка выдачи -> Analysis: одна и та же строка у разных слов разбирается один раз
+PARSED_LIMIT = 200000
+
+def parse_analysis(text: str) -> Analysis:
+    """Строка выдачи анализатора "лемма<TAB>граммема" -> Analysis."""
+    found = PARSED.get(text)
+    if found is None:
+        lemma, _, gram = text.partition('\t')
+        found = Analysis(lemma, sys.intern(gram))
+        if len(PARSED) >= PARSED_LIMIT:
+            PARSED.clear()
+        PARSED[text] = found
+    return found
+
+def analyses(analyzer, word: str) -> list[Analysis]:
+    """Разборы слова (уже в записи анализатора) без повторов, в порядке выдачи."""
+    return [parse_analysis(x) for x in dict.fromkeys(analyzer.apply(word))]
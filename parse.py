@@ -2,38 +2,62 @@
 Модуль с функциями для чтения и анализа языковых данных.
 """
 
+import hashlib
+import io
 import os
 import Morphology
+import corpuscache
+from instrument import remote, stage, unwrap
 from bs4 import BeautifulSoup
-from random import shuffle
+from html.parser import HTMLParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from random import Random, shuffle
 
-def parse_table(table, test=False) -> Morphology.Paradigm | list[Morphology.WordForm] :
+def spans_to_forms(spans) -> list[Morphology.WordForm]:
     """
-    Анализ html-таблицы из Викисловаря. Логика полагается на разметку, которая принята в Викисловаре.
-    Возвращает извлечённую из таблицы парадигму в нормальном режиме или 
-    5% увиденных словоформ в режиме набора тестовой выборки. 
+    Словоформы из span-ов таблицы, заданных парами (список классов, текст). Span словоформы в Викисловаре
+    имеет классы вида "Latn form-of lang-la 1|s|pres|act|ind-form-of origin-amō".
     """
     entries = []
-    span_tag = table.find_all("span")
-    for span in span_tag:
+    for classes, text in spans:
         gloss = ''
-        if len(span['class']) > 1:
-            gloss = span['class'][3].removesuffix('-form-of')
-            lemma = span['class'][4].removeprefix('origin-')
-            form = span.text.strip()
+        if len(classes) > 1:
+            gloss = classes[3].removesuffix('-form-of')
+            lemma = classes[4].removeprefix('origin-')
+            form = text.strip()
             entries.append(Morphology.WordForm(form, lemma, Morphology.Grammeme(gloss.split('|'))))
-    
+    return entries
+
+def forms_result(entries: list[Morphology.WordForm], test=False, rng=None) -> Morphology.Paradigm | list[Morphology.WordForm]:
+    """
+    Извлечённая из словоформ парадигма в нормальном режиме или 5% словоформ в режиме набора тестовой выборки
+    (выбираются генератором rng, по умолчанию — общим генератором модуля random).
+    """
     if len(entries) > 0:
         if test:
-            shuffle(entries)
+            (rng.shuffle if rng else shuffle)(entries)
             return entries[:len(entries) // 20]
         lex = Morphology.Lexeme(entries)
         par = lex.extract_paradigm()
     return par
 
-def read_html(contents, test=False):
+def parse_spans(spans, test=False, rng=None) -> Morphology.Paradigm | list[Morphology.WordForm]:
+    """Парадигма или тестовая выборка из span-ов таблицы (см. spans_to_forms и forms_result)."""
+    return forms_result(spans_to_forms(spans), test, rng)
+
+def parse_table(table, test=False) -> Morphology.Paradigm | list[Morphology.WordForm] :
     """
-    Чтение html-файла и поиск в нём латинской таблицы словоизменения в викисловарном формате.
+    Анализ html-таблицы из Викисловаря (дерева BeautifulSoup). Логика полагается на разметку, которая принята в Викисловаре.
+    Возвращает извлечённую из таблицы парадигму в нормальном режиме или 
+    5% увиденных словоформ в режиме набора тестовой выборки. 
+    """
+    return parse_spans([(span.get('class', []), span.text) for span in table.find_all("span")], test)
+
+def read_html_soup(contents, test=False):
+    """
+    Чтение html-файла и поиск в нём латинской таблицы словоизменения в викисловарном формате
+    через полное дерево BeautifulSoup. Медленнее, чем read_html, и оставлено для сверки.
     """
     soup = BeautifulSoup(contents, "html.parser")
     table_tags = soup.find_all("table", {"class": "roa-inflection-table"})
@@ -50,6 +74,86 @@ def read_html(contents, test=False):
     else:
         print("Таблица глагола не найдена!")
         return None
+
+class TableFound(Exception):
+    """Сигнал остановить разбор страницы: латинская таблица уже прочитана."""
+
+class TableExtractor(HTMLParser):
+    """
+    Потоковый поиск латинской таблицы словоизменения без построения дерева.
+    Внутри таблиц класса roa-inflection-table запоминаются только классы и текст span-ов, остальная страница
+    пропускается. Как и в read_html_soup, берётся последняя таблица с span-ом lang="la"; все таблицы
+    одного языка стоят в одном разделе страницы, так что, прочитав латинскую таблицу, мы останавливаемся
+    на заголовке следующего раздела (h2) и не читаем страницу дальше.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0 # вложенность тегов table внутри текущей таблицы словоизменения
+        self.spans = [] # span-ы текущей таблицы: [классы, текст]
+        self.open_spans = [] # span-ы текущей таблицы, которые ещё не закрыты
+        self.latin = False
+        self.table = None # span-ы последней найденной латинской таблицы
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h2' and self.table is not None and self.depth == 0:
+            raise TableFound()
+        if tag == 'table':
+            if self.depth:
+                self.depth += 1
+            elif 'roa-inflection-table' in (dict(attrs).get('class') or '').split():
+                self.depth = 1
+                self.spans, self.open_spans, self.latin = [], [], False
+        elif tag == 'span' and self.depth:
+            attrs = dict(attrs)
+            span = [(attrs.get('class') or '').split(), []]
+            self.spans.append(span)
+            self.open_spans.append(span)
+            if attrs.get('lang') == 'la':
+                self.latin = True
+
+    def handle_endtag(self, tag):
+        if not self.depth:
+            return
+        if tag == 'span' and self.open_spans:
+            self.open_spans.pop()
+        elif tag == 'table':
+            self.depth -= 1
+            if not self.depth:
+                self.open_spans = []
+                if self.latin:
+                    self.table = self.spans
+
+    def handle_data(self, data):
+        for span in self.open_spans: # текст span-а — весь текст внутри него, в том числе во вложенных тегах
+            span[1].append(data)
+
+    def extract(self, contents, chunk_size: int = 1 << 16):
+        """Span-ы латинской таблицы как пары (классы, текст) или None. contents — строка или открытый файл."""
+        try:
+            if isinstance(contents, str):
+                self.feed(contents)
+            else:
+                while chunk := contents.read(chunk_size):
+                    self.feed(chunk)
+            self.close()
+        except TableFound:
+            pass
+        if self.table is None:
+            return None
+        return [(classes, ''.join(text)) for classes, text in self.table]
+
+def read_html(contents, test=False):
+    """
+    Чтение html-файла и поиск в нём латинской таблицы словоизменения в викисловарном формате.
+    Страница читается потоково (TableExtractor) и только до конца латинского раздела.
+    """
+    spans = TableExtractor().extract(contents)
+    if spans is not None:
+        return parse_spans(spans, test)
+    else:
+        print("Таблица глагола не найдена!")
+        return None
     
 def read_model(file):
     """
@@ -71,23 +175,170 @@ def read_model(file):
     model = Morphology.Model(stems, affixes, name)
     return model
 
-def directory_scan(sample_size: int):
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    verbdir = dir_path + '\\Verbs'
-    paradigms = []
-    counter = 0
-    directory = os.fsencode(verbdir)
-    files = os.listdir(directory)
-    shuffle(files)
-    for file in files:
-        if counter == sample_size:
-            break
-        filename = os.fsdecode(file)
-        print(filename)
-        with open(f'{verbdir}\\{filename}', encoding="utf8") as fin:
-            table = read_html(fin)
-        if table is not None:
-            paradigms.append(table)
-            counter += 1
-    models = Morphology.create_models(paradigms)
-    return models
\ No newline at end of file
+class IngestError:
+    """Файл, который не удалось превратить в парадигму или выборку, и причина."""
+
+    def __init__(self, file: str, message: str):
+        self.file = file
+        self.message = message
+
+    def __repr__(self) -> str:
+        return f'{self.file}: {self.message}'
+
+def verb_folder() -> str:
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), 'Verbs')
+
+CORPUS_CACHE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'corpus_cache.sqlite')
+
+def read_file(path: str, test=False, rng=None, corpus: str | None = None):
+    """ingest_file без перехвата ошибок: пара (итог, отпечаток файла — см. fingerprint)."""
+    name = os.path.basename(path)
+    cache = corpuscache.open_cache(corpus) if corpus else None
+    if cache is not None and (entry := cache.lookup(path)) is not None:
+        error, prints = entry
+        if error is not None:
+            return IngestError(name, error), prints
+        if not test and (paradigm := cache.paradigm(path)) is not None:
+            return paradigm, prints
+        result = forms_result(cache.forms(path), test, rng)
+        if not test:
+            cache.store_paradigm(path, result)
+        return result, prints
+    with open(path, 'rb') as fin:
+        contents = fin.read()
+    prints = fingerprint(path, contents)
+    spans = TableExtractor().extract(io.TextIOWrapper(io.BytesIO(contents), encoding='utf8'))
+    if spans is None:
+        if cache is not None:
+            cache.store(path, contents, None, "Таблица глагола не найдена!")
+        return IngestError(name, "Таблица глагола не найдена!"), prints
+    forms = spans_to_forms(spans)
+    if cache is not None: # словоформы запоминаются до выделения парадигмы: Lexeme меняет их
+        cache.store(path, contents, forms)
+    result = forms_result(forms, test, rng)
+    if cache is not None and not test:
+        cache.store_paradigm(path, result)
+    return result, prints
+
+def ingest_file(path: str, test=False, seed=None, corpus: str | None = None, fingerprints=False):
+    """
+    Прочитать один html-файл: парадигма (или выборка словоформ при test=True) либо IngestError.
+    При заданном seed выборка словоформ зависит только от seed и имени файла, а не от порядка обработки.
+    corpus — путь к кэшу разобранного корпуса (corpuscache): если файл с прошлого раза не менялся,
+    словоформы и парадигма берутся оттуда и страница не разбирается.
+    При fingerprints=True возвращается пара (итог, отпечаток файла): отпечаток берётся из кэша корпуса
+    или считается по уже прочитанному содержимому, так что файл второй раз не читается.
+    """
+    name = os.path.basename(path)
+    rng = None if seed is None else Random(f'{seed}:{name}')
+    try:
+        result, prints = read_file(path, test, rng, corpus)
+    except Exception as e:
+        result, prints = IngestError(name, repr(e)), None
+    return (result, prints) if fingerprints else result
+
+def ingest_chunk(paths: list[str], test=False, seed=None, corpus: str | None = None, fingerprints=False) -> list:
+    results = []
+    for path in paths:
+        with stage('parse', file=os.path.basename(path)):
+            results.append(ingest_file(path, test, seed, corpus, fingerprints))
+    return results
+
+def ingest_stream(paths: list[str], sample_size: int | None = None, test=False, workers: int | None = None, chunk_size: int = 8, seed=None,
+                  corpus: str | None = None, fingerprints=False):
+    """
+    Чтение файлов в пуле процессов с выдачей результатов по одному. Файлы раздаются порциями по chunk_size,
+    результаты (и IngestError) выдаются в порядке списка paths, так что итог не зависит от числа процессов.
+    Чтение заканчивается, когда набралось sample_size удачных файлов.
+    При заданном corpus файлы сначала ищутся в кэше разобранного корпуса.
+    При fingerprints=True вместо результатов выдаются пары (результат, отпечаток файла), посчитанные в пуле.
+    """
+    if sample_size == 0:
+        return
+    chunks = deque(paths[i:i+chunk_size] for i in range(0, len(paths), chunk_size))
+    pool = ProcessPoolExecutor(workers) if workers != 1 else None
+    window = 2 * (workers or os.cpu_count() or 1) # сколько порций держим в работе одновременно
+    pending = deque()
+    found = 0
+    try:
+        while chunks or pending:
+            while chunks and len(pending) < window:
+                chunk = chunks.popleft()
+                pending.append(pool.submit(remote(ingest_chunk), chunk, test, seed, corpus, fingerprints) if pool
+                               else ingest_chunk(chunk, test, seed, corpus, fingerprints))
+            done = pending.popleft()
+            for outcome in (unwrap(done.result()) if pool else done):
+                yield outcome
+                if not isinstance(outcome[0] if fingerprints else outcome, IngestError):
+                    found += 1
+                    if sample_size is not None and found == sample_size:
+                        return
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def ingest(paths: list[str], sample_size: int | None = None, test=False, workers: int | None = None, chunk_size: int = 8, seed=None,
+           corpus: str | None = None):
+    """То же, что ingest_stream, но списком: возвращает список результатов и список IngestError."""
+    results, errors = [], []
+    for outcome in ingest_stream(paths, sample_size, test, workers, chunk_size, seed, corpus):
+        (errors if isinstance(outcome, IngestError) else results).append(outcome)
+    return results, errors
+
+def list_files(folder: str, seed=None) -> list[str]:
+    """Файлы папки в случайном порядке; при заданном seed порядок воспроизводим."""
+    files = sorted(os.fsdecode(file) for file in os.listdir(os.fsencode(folder)))
+    if seed is not None:
+        Random(seed).shuffle(files)
+    else:
+        shuffle(files)
+    return [os.path.join(folder, file) for file in files]
+
+def scan_paradigms(sample_size: int, workers: int | None = None, seed=None, corpus: str | None = CORPUS_CACHE):
+    """
+    Парадигмы sample_size случайных таблиц из папки Verbs и список файлов, которые прочитать не удалось.
+    Неизменившиеся файлы берутся из кэша корпуса corpus; corpus=None — читать все файлы заново.
+    """
+    paradigms, errors = ingest(list_files(verb_folder(), seed), sample_size, workers=workers, seed=seed, corpus=corpus)
+    print(f"Прочитано таблиц: {len(paradigms)}, без таблицы или с ошибкой: {len(errors)}")
+    return paradigms, errors
+
+def fingerprint(path: str, contents: bytes | None = None) -> tuple[int, int, str]:
+    """
+    Размер, время изменения (нс) и sha256 содержимого файла — по ним замечаются изменившиеся страницы.
+    Уже прочитанное содержимое можно передать в contents, чтобы не читать файл ещё раз.
+    """
+    stat = os.stat(path)
+    if contents is None:
+        with open(path, 'rb') as inp:
+            contents = inp.read()
+    return stat.st_size, stat.st_mtime_ns, hashlib.sha256(contents).hexdigest()
+
+def scan_models(paths: list[str], sample_size: int | None = None, workers: int | None = None, seed=None,
+                corpus: str | None = CORPUS_CACHE, inducer: Morphology.ModelInducer | None = None):
+    """
+    Прочитать файлы и слить их парадигмы в модели по мере чтения (Morphology.ModelInducer), так что
+    весь корпус парадигм в памяти не держится. Если передан inducer, модели дополняются в нём.
+    Возвращает inducer и опись прочитанных файлов: имя -> fingerprint.
+    """
+    inducer = inducer or Morphology.ModelInducer()
+    manifest = {}
+    errors = 0
+    # ingest_stream выдаёт ровно один результат на файл в порядке списка, так что результат и файл идут парой;
+    # отпечатки файлов считаются в пуле вместе с чтением (или берутся из кэша корпуса)
+    with stage('scan', files=len(paths)) as info:
+        for path, (outcome, prints) in zip(paths, ingest_stream(paths, sample_size, workers=workers, seed=seed, corpus=corpus,
+                                                                  fingerprints=True)):
+            if isinstance(outcome, IngestError):
+                errors += 1
+            else:
+                inducer.add(outcome, os.path.basename(path))
+                manifest[os.path.basename(path)] = prints
+        info.update(read=len(manifest), errors=errors, models=len(inducer.models))
+    print(f"Прочитано таблиц: {len(manifest)}, без таблицы или с ошибкой: {errors}")
+    return inducer, manifest
+
+def directory_scan(sample_size: int, workers: int | None = None, seed=None, corpus: str | None = CORPUS_CACHE):
+    """Модели спряжения по sample_size случайным таблицам из папки Verbs (см. scan_models)."""
+    inducer, _ = scan_models(list_files(verb_folder(), seed), sample_size, workers, seed, corpus)
+    return inducer.models
@@ -0,0 +1,205 @@
+"""
+Локальный сервер разборов. Анализатор открывается один раз при запуске (в каждом процессе пула),
+одновременные запросы собираются в небольшие пачки, повторяющиеся слова берутся из общего кэша,
+а сам разбор идёт в пуле процессов, так что цикл событий не блокируется.
+
+    python server.py --port 8765 -j 2
+    curl 'http://127.0.0.1:8765/analyze?word=amāre'
+    curl -d '{"words": ["amō", "amās"]}' http://127.0.0.1:8765/analyze
+    curl http://127.0.0.1:8765/stats
+
+Вместо TCP-порта можно слушать Unix-сокет (--unix путь).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from urllib.parse import parse_qs, urlsplit
+from batch import ResultCache, analyze_words, init_worker
+
+class Stats:
+    """Счётчики сервера: запросы, слова, пачки, попадания в кэш, задержки последних запросов."""
+
+    def __init__(self, window: int = 1000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.words = 0
+        self.batches = 0
+        self.batched_words = 0
+        self.cache_hits = 0
+        self.latencies = deque(maxlen=window)
+
+    def report(self) -> dict:
+        latencies = sorted(self.latencies)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+        uptime = time.monotonic() - self.started
+        return {
+            'uptime_s': round(uptime, 3),
+            'requests': self.requests,
+            'words': self.words,
+            'words_per_s': round(self.words / uptime, 1) if uptime else 0.0,
+            'batches': self.batches,
+            'mean_batch': round(self.batched_words / self.batches, 2) if self.batches else 0.0,
+            'cache_hits': self.cache_hits,
+            'latency_ms': {'p50': round(percentile(0.5), 3), 'p95': round(percentile(0.95), 3), 'max': round(percentile(1.0), 3)},
+        }
+
+class Batcher:
+    """
+    Сбор слов из одновременных запросов в пачки. Пачка уходит в пул, когда набралось max_batch слов
+    или прошло max_delay секунд с прихода первого слова. Слова из кэша отвечаются сразу.
+    """
+
+    def __init__(self, executor, cache: ResultCache, stats: Stats, max_batch: int = 256, max_delay: float = 0.002):
+        self.executor = executor
+        self.cache = cache
+        self.stats = stats
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.waiting = {} # слово -> список ожидающих его future
+        self.flusher = None
+        self.running = set() # задачи пачек в работе; ссылки держим, чтобы их не собрал сборщик мусора
+
+    async def analyze(self, word: str):
+        cached = self.cache.get(word)
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return cached
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.setdefault(word, []).append(future)
+        if len(self.waiting) >= self.max_batch:
+            self.flush()
+        elif self.flusher is None:
+            self.flusher = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        if self.flusher is not None:
+            self.flusher.cancel()
+            self.flusher = None
+        if not self.waiting:
+            return
+        batch, self.waiting = self.waiting, {}
+        self.stats.batches += 1
+        self.stats.batched_words += len(batch)
+        task = asyncio.ensure_future(self.run(batch))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def run(self, batch: dict):
+        words = list(batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, analyze_words, words)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    future.set_exception(e)
+            return
+        for w, analyses in zip(words, results):
+            self.cache.put(w, analyses)
+            for future in batch[w]:
+                if not future.done():
+                    future.set_result(analyses)
+
+class AnalysisServer:
+    def __init__(self, path: str | None = None, workers: int = 1, cache_size: int = 100000, max_batch: int = 256, max_delay: float = 0.002):
+        # процессы запускаются через spawn: при fork они унаследовали бы открытые сокеты соединений
+        self.executor = ProcessPoolExecutor(workers, mp_context=get_context('spawn'), initializer=init_worker, initargs=(path,))
+        self.stats = Stats()
+        self.batcher = Batcher(self.executor, ResultCache(cache_size), self.stats, max_batch, max_delay)
+
+    async def answer(self, words: list[str]) -> list[dict]:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.batcher.analyze(w) for w in words))
+        self.stats.requests += 1
+        self.stats.words += len(words)
+        self.stats.latencies.append(time.perf_counter() - start)
+        return [{'word': w, 'analyses': [{'lemma': a.display_lemma, 'grammeme': a.grammeme} for a in analyses]}
+                for w, analyses in zip(words, results)]
+
+    async def route(self, method: str, target: str, body: bytes) -> tuple[int, object]:
+        url = urlsplit(target)
+        if url.path == '/stats' and method == 'GET':
+            return 200, self.stats.report()
+        if url.path == '/analyze':
+            if method == 'GET':
+                words = parse_qs(url.query).get('word', [])
+            elif method == 'POST':
+                try:
+                    words = json.loads(body or b'{}').get('words', [])
+                except (ValueError, AttributeError):
+                    return 400, {'error': 'expected JSON {"words": [...]}'}
+            else:
+                return 405, {'error': 'method not allowed'}
+            return 200, await self.answer([str(w) for w in words])
+        return 404, {'error': 'not found'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Простейший HTTP/1.1 с keep-alive: строка запроса, заголовки, тело по Content-Length."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {'error': repr(e)}
+                data = json.dumps(payload, ensure_ascii=False).encode('utf8')
+                close = headers.get('connection', '').lower() == 'close'
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode('latin1') + data)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765, unix: str | None = None) -> asyncio.AbstractServer:
+        # первая пачка запускает процессы пула и открывает в них анализатор ещё до приёма соединений
+        await asyncio.get_running_loop().run_in_executor(self.executor, analyze_words, [])
+        if unix:
+            return await asyncio.start_unix_server(self.handle, path=unix)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+async def main(args):
+    server = AnalysisServer(args.fst, args.workers, args.cache, args.batch, args.delay / 1000)
+    listener = await server.start(args.host, args.port, args.unix)
+    where = args.unix or ', '.join(str(s.getsockname()) for s in listener.sockets)
+    print(f"Сервер слушает {where}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Локальный сервер разборов латинских словоформ.')
+    argparser.add_argument('--host', default='127.0.0.1')
+    argparser.add_argument('--port', type=int, default=8765)
+    argparser.add_argument('--unix', default=None, help='путь к Unix-сокету вместо TCP-порта')
+    argparser.add_argument('--fst', default=None, help='файл анализатора (по умолчанию latest_FST.lvfst или latest_FST.pkl)')
+    argparser.add_argument('-j', '--workers', type=int, default=1, help='число процессов для разбора')
+    argparser.add_argument('--cache', type=int, default=100000, help='сколько разных слов держать в кэше')
+    argparser.add_argument('--batch', type=int, default=256, help='наибольший размер пачки слов')
+    argparser.add_argument('--delay', type=float, default=2.0, help='сколько миллисекунд ждать пополнения пачки')
+    asyncio.run(main(argparser.parse_args()))
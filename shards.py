@@ -0,0 +1,178 @@
+"""
+Анализатор, разбитый на части по концам аффиксов. Вход любого аффикса модели кончается последним куском его формы
+(тем, что Foma.model_fst компилирует последним), так что аффикс может разобрать только слово, которое кончается
+на этот кусок. Аффиксы всех моделей раскладываются по последнему символу этого куска (буква или буква с дефисом
+макрона, "o-"), и из каждой такой группы собирается небольшой преобразователь $letter+ (аффиксы группы),
+переведённый в таблицы lookup.Analyzer. Число частей ограничено (max_shards): самые мелкие группы сливаются в одну.
+Слово разбирают только части его последнего символа и часть аффиксов с пустым последним куском, если она есть;
+разборы те же, что у общего преобразователя (повторы убираются), а детерминизировать всё объединение не приходится.
+
+    python shards.py                      # собрать latest_FST.shards по моделям последней сборки (latest_models.pkl)
+    python shards.py --check words.txt    # сверить разборы и скорость с latest_FST.pkl
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pyfoma import FST
+from Morphology import Model
+from lookup import Analyzer
+from fstcache import FstCache, model_key
+from instrument import pool_map
+
+MAX_SHARDS = 16
+
+class ShardedAnalyzer:
+    """Части анализатора (lookup.Analyzer) и индекс "последний символ слова -> номера частей"."""
+
+    def __init__(self, shards: list[Analyzer], keys: list[set[str]]):
+        self.shards = shards
+        self.index = {}
+        for number, ends in enumerate(keys):
+            for key in ends:
+                self.index.setdefault(key, []).append(number)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def candidates(self, word: str) -> list[int]:
+        """Номера частей, у которых есть аффикс, кончающийся так же, как слово (в порядке номеров)."""
+        found = set(self.index.get('', ()))
+        found.update(self.index.get(word[-1:], ()))
+        if word.endswith('-'):
+            found.update(self.index.get(word[-2:], ()))
+        return sorted(found)
+
+    def apply(self, word: str):
+        numbers = self.candidates(word)
+        if len(numbers) == 1: # в одной части разборы не повторяются, как и в общем преобразователе
+            yield from self.shards[numbers[0]].apply(word)
+            return
+        seen = set()
+        for number in numbers:
+            for analysis in self.shards[number].apply(word):
+                if analysis not in seen:
+                    seen.add(analysis)
+                    yield analysis
+
+def ending_key(piece: str) -> str:
+    """Последний символ куска входа: буква с дефисом макрона ("o-"), одна буква или "" у пустого куска."""
+    return piece[-2:] if len(piece) > 1 and piece[-1] == '-' else piece[-1:]
+
+def final_piece(model: Model, affix) -> str:
+    """Кусок формы аффикса, которым кончается его вход: тот, что model_fst компилирует последним."""
+    return affix.form.split('_')[model.parts - 1]
+
+def group_affixes(models: list[Model], max_shards: int = MAX_SHARDS) -> list[tuple[set[str], dict[int, list]]]:
+    """
+    Аффиксы моделей по частям: пары (символы конца части, номер модели -> её аффиксы в части).
+    Группы по последнему символу упорядочены по числу аффиксов; сверх max_shards - 1 самые мелкие сливаются в одну.
+    Модели без частей основы пропускаются — model_fst их тоже не компилирует.
+    """
+    groups = {}
+    for i, model in enumerate(models):
+        if not model.parts:
+            continue
+        for affix in model.affixes:
+            groups.setdefault(ending_key(final_piece(model, affix)), {}).setdefault(i, []).append(affix)
+    order = sorted(groups, key=lambda key: (-sum(map(len, groups[key].values())), key))
+    shards = [({key}, groups[key]) for key in order[:max_shards - 1]]
+    rest = order[max_shards - 1:]
+    if rest:
+        merged = {}
+        for key in rest:
+            for i, affixes in groups[key].items():
+                merged.setdefault(i, []).extend(affixes)
+        shards.append((set(rest), merged))
+    return shards
+
+def part_key(model: Model, keys: set[str]) -> str:
+    """Ключ кэша для аффиксов модели, попавших в часть с такими символами конца."""
+    return hashlib.sha256(json.dumps([model_key(model), 'shard', sorted(keys)]).encode('utf8')).hexdigest()
+
+def compile_part(item: tuple[Model, list]) -> FST:
+    from Foma import model_fst, normalize
+    model, affixes = item
+    return normalize(model_fst(model, affixes))
+
+def make_shard(parts: list[FST]) -> Analyzer:
+    from Foma import attach_letters, reduce_union
+    return Analyzer(attach_letters(reduce_union(parts)))
+
+def build_sharded(models: list[Model | None], workers: int | None = None, cache: FstCache | None = None,
+                  max_shards: int = MAX_SHARDS) -> ShardedAnalyzer:
+    """
+    Части по группам аффиксов с общим последним символом: преобразователи аффиксов каждой модели в части
+    берутся из кэша или компилируются, внутри части объединяются, и к каждому объединению приписывается $letter+.
+    """
+    models = [model for model in models if model is not None]
+    groups = group_affixes(models, max_shards)
+    items = [(keys, i, affixes) for keys, members in groups for i, affixes in members.items()]
+    compiled = [cache.get(part_key(models[i], keys)) if cache is not None else None for keys, i, _ in items]
+    missing = [n for n, fst in enumerate(compiled) if fst is None]
+    pool = ProcessPoolExecutor(workers) if workers != 1 else None
+    try:
+        for n, fst in zip(missing, pool_map(pool, compile_part, [(models[items[n][1]], items[n][2]) for n in missing])):
+            compiled[n] = fst
+            if cache is not None:
+                cache.put(part_key(models[items[n][1]], items[n][0]), fst)
+        parts = {}
+        for (keys, _, _), fst in zip(items, compiled):
+            parts.setdefault(frozenset(keys), []).append(fst)
+        shards = list(pool_map(pool, make_shard, list(parts.values())))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"Моделей: {len(models)}, частей: {len(shards)}, преобразователей аффиксов скомпилировано: {len(missing)}, "
+          f"взято из кэша: {len(items) - len(missing)}")
+    return ShardedAnalyzer(shards, [set(keys) for keys in parts])
+
+def save(analyzer: ShardedAnalyzer, path: str):
+    with open(path, 'wb') as outp:
+        pickle.dump(analyzer, outp, pickle.HIGHEST_PROTOCOL)
+
+def load(path: str) -> ShardedAnalyzer:
+    with open(path, 'rb') as inp:
+        return pickle.load(inp)
+
+def check(words: list[str], sharded: ShardedAnalyzer, path: str = 'latest_FST.pkl'):
+    """Сверить разборы (как множества) с общим преобразователем и сравнить скорость."""
+    from lookup import load_analyzer
+    whole = load_analyzer(path)
+    for w in words:
+        if set(whole.apply(w)) != set(sharded.apply(w)):
+            raise Exception(f"Error: analyses differ for {w}")
+    print(f"Разборы совпадают на {len(words)} словах; частей: {len(sharded)}, "
+          f"в среднем запускается: {sum(len(sharded.candidates(w)) for w in words) / max(len(words), 1):.1f}")
+    for name, analyzer in [('общий', whole), ('по частям', sharded)]:
+        start = time.perf_counter()
+        for w in words:
+            for _ in analyzer.apply(w):
+                pass
+        print(f"{name}: {len(words) / (time.perf_counter() - start):.0f} слов/с")
+
+if __name__ == '__main__':
+    from Foma import STATE, load_state
+    from Morphology import demacronize
+    argparser = argparse.ArgumentParser(description='Сборка анализатора, разбитого на части по концам аффиксов.')
+    argparser.add_argument('--state', default=STATE, help='файл моделей последней сборки')
+    argparser.add_argument('-o', '--output', default='latest_FST.shards')
+    argparser.add_argument('-j', '--workers', type=int, default=None, help='число процессов')
+    argparser.add_argument('--cache', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fst_cache'), help='папка кэша скомпилированных моделей')
+    argparser.add_argument('--max-shards', type=int, default=MAX_SHARDS, help='наибольшее число частей')
+    argparser.add_argument('--check', default=None, help='файл со словами для сверки с latest_FST.pkl')
+    args = argparser.parse_args()
+
+    # класс берётся из модуля shards, а не из __main__: иначе pickle запишет __main__.ShardedAnalyzer,
+    # и load_analyzer в batch.py или test.py файл не откроет
+    import shards
+    sharded = shards.build_sharded(load_state(args.state)['inducer'].models, args.workers, FstCache(args.cache), args.max_shards)
+    shards.save(sharded, args.output)
+    print(f"Символов конца в индексе: {len(sharded.index)}, сохранено в {args.output}")
+    if args.check:
+        with open(args.check, encoding='utf8') as fin:
+            check([demacronize(w) for line in fin for w in line.split()], sharded)
@@ -1,12 +1,11 @@
 """
-Загрузка преобразователя из файла latest_FST.pkl для проверки слов, вводимых пользователем по одному.
+Загрузка преобразователя из файла latest_FST.lvfst (или latest_FST.pkl) для проверки слов, вводимых пользователем по одному.
 """
 
-import pickle
+from lookup import load_analyzer
 from Morphology import demacronize, remacronize
 
-with open('latest_FST.pkl', 'rb') as inp:
-    word = pickle.load(inp)
+word = load_analyzer()
 
 print("Введите что-нибудь похожее на форму латинского глагола.")
 print("Долгие гласные нужно писать:")
@@ -0,0 +1,134 @@
+"""
+Детерминированный генератор синтетического корпуса: html-страницы в духе Викисловаря с таблицами спряжения
+выдуманных латинских глаголов четырёх спряжений. Страница устроена как настоящая: раздел другого языка
+со своей таблицей, латинский раздел с таблицей roa-inflection-table, где у каждой формы span с классами
+"Latn form-of lang-la <граммема>-form-of origin-<лемма>", и следующие разделы с балластом.
+Основы перфекта и супина у глаголов разные, часть клеток (дефектные парадигмы) может пропадать,
+так что модели, выражения основ и преобразователь получаются непустыми. При одном и том же seed корпус одинаков.
+
+    python synthetic.py Synthetic -n 2000 --seed 1
+"""
+
+import argparse
+import os
+from random import Random
+
+PERSONS = ['1|s', '2|s', '3|s', '1|p', '2|p', '3|p']
+PERFECT = ['ī', 'istī', 'it', 'imus', 'istis', 'ērunt']
+FUTURE_PERFECT = ['erō', 'eris', 'erit', 'erimus', 'eritis', 'erint']
+
+def series(short: str, long: str) -> list[str]:
+    """Личные окончания -m, -s, -t, -mus, -tis, -nt после гласной, которая долгая перед s, mus и tis."""
+    return [short + 'm', long + 's', short + 't', long + 'mus', long + 'tis', short + 'nt']
+
+def future(vowel: str) -> list[str]:
+    return [vowel + e for e in ['bō', 'bis', 'bit', 'bimus', 'bitis', 'bunt']]
+
+# спряжение -> (настоящее действ., имперфект, будущее, наст. субъюнктив, имперф. субъюнктив, настоящее страд.,
+#               императив, инфинитивы действ. и страд., герундий, причастие наст., гласная основы перфекта и супина)
+CONJUGATIONS = {
+    'first': (['ō', 'ās', 'at', 'āmus', 'ātis', 'ant'], series('āba', 'ābā'), future('ā'), series('e', 'ē'),
+              series('āre', 'ārē'), ['or', 'āris', 'ātur', 'āmur', 'āminī', 'antur'], ['ā', 'āte'], ('āre', 'ārī'),
+              'and', 'āns', 'ā'),
+    'second': (['eō', 'ēs', 'et', 'ēmus', 'ētis', 'ent'], series('ēba', 'ēbā'), future('ē'), series('ea', 'eā'),
+               series('ēre', 'ērē'), ['eor', 'ēris', 'ētur', 'ēmur', 'ēminī', 'entur'], ['ē', 'ēte'], ('ēre', 'ērī'),
+               'end', 'ēns', 'i'),
+    'third': (['ō', 'is', 'it', 'imus', 'itis', 'unt'], series('ēba', 'ēbā'), ['am', 'ēs', 'et', 'ēmus', 'ētis', 'ent'],
+              series('a', 'ā'), series('ere', 'erē'), ['or', 'eris', 'itur', 'imur', 'iminī', 'untur'], ['e', 'ite'],
+              ('ere', 'ī'), 'end', 'ēns', ''),
+    'fourth': (['iō', 'īs', 'it', 'īmus', 'ītis', 'iunt'], series('iēba', 'iēbā'), ['iam', 'iēs', 'iet', 'iēmus', 'iētis', 'ient'],
+               series('ia', 'iā'), series('īre', 'īrē'), ['ior', 'īris', 'ītur', 'īmur', 'īminī', 'iuntur'], ['ī', 'īte'],
+               ('īre', 'īrī'), 'iend', 'iēns', 'ī'),
+}
+PERFECT_SUFFIXES = {'first': ['āv'], 'second': ['u', 'ēv', 's'], 'third': ['s', 'x', '', None], 'fourth': ['īv', 'u', 's']} # None — чередование гласной корня
+SUPINE_CONSONANTS = {'first': ['t'], 'second': ['t'], 'third': ['t', 's'], 'fourth': ['t']}
+ONSETS = ['', 'b', 'c', 'd', 'f', 'g', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'cl', 'pr', 'st', 'tr', 'sp']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'au']
+CODAS = ['', '', 'n', 'r', 's', 'l', 'm', 'c', 'p', 't', 'nd', 'rt', 'st']
+
+def make_root(rng: Random) -> str:
+    syllables = [rng.choice(ONSETS) + rng.choice(VOWELS) for _ in range(rng.randint(1, 2))]
+    return ''.join(syllables) + rng.choice(CODAS[2:])
+
+def ablaut(root: str) -> str:
+    """Основа перфекта с чередованием: последняя гласная корня заменяется долгой ē (ag- -> ēg-)."""
+    for i in range(len(root) - 1, -1, -1):
+        if root[i] in 'aeiou':
+            return root[:i] + 'ē' + root[i+1:]
+    return root + 'ē'
+
+def conjugate(root: str, conjugation: str, perfect: str, supine: str) -> list[tuple[str, str]]:
+    """Клетки таблицы: пары (граммема, форма)."""
+    present, imperfect, fut, subjunctive, imperfect_sub, passive, imperative, infinitives, gerund, participle, _ = CONJUGATIONS[conjugation]
+    cells = []
+    for tense, mood, voice, endings, stem in [
+            ('pres', 'ind', 'act', present, root), ('impf', 'ind', 'act', imperfect, root), ('fut', 'ind', 'act', fut, root),
+            ('perf', 'ind', 'act', PERFECT, perfect), ('plup', 'ind', 'act', series('era', 'erā'), perfect),
+            ('futp', 'ind', 'act', FUTURE_PERFECT, perfect), ('pres', 'sub', 'act', subjunctive, root),
+            ('impf', 'sub', 'act', imperfect_sub, root), ('perf', 'sub', 'act', series('eri', 'erī'), perfect),
+            ('plup', 'sub', 'act', series('isse', 'issē'), perfect), ('pres', 'ind', 'pass', passive, root)]:
+        cells += [(f'{person}|{tense}|{voice}|{mood}', stem + ending) for person, ending in zip(PERSONS, endings)]
+    cells += [('2|s|pres|act|imp', root + imperative[0]), ('2|p|pres|act|imp', root + imperative[1])]
+    cells += [('pres|act|inf', root + infinitives[0]), ('pres|pass|inf', root + infinitives[1]), ('perf|act|inf', perfect + 'isse')]
+    cells += [('pres|act|part', root + participle), ('perf|pass|part', supine + 'us'), ('fut|act|part', supine + 'ūrus')]
+    cells += [('gen|ger', root + gerund + 'ī'), ('dat|ger', root + gerund + 'ō'), ('acc|sup', supine + 'um'), ('abl|sup', supine + 'ū')]
+    return cells
+
+def make_verb(rng: Random, root: str, defective: float = 0.0) -> tuple[str, list[tuple[str, str]]]:
+    """Лемма (1 л. ед. ч. наст. вр. действ. залога) и клетки таблицы глагола со случайным спряжением."""
+    conjugation = rng.choice(list(CONJUGATIONS))
+    suffix = rng.choice(PERFECT_SUFFIXES[conjugation])
+    perfect = root + suffix if suffix is not None else ablaut(root)
+    supine = root + CONJUGATIONS[conjugation][-1] + rng.choice(SUPINE_CONSONANTS[conjugation])
+    cells = conjugate(root, conjugation, perfect, supine)
+    lemma = cells[0][1]
+    if defective:
+        cells = cells[:1] + [cell for cell in cells[1:] if rng.random() >= defective]
+    return lemma, cells
+
+def page(lemma: str, cells: list[tuple[str, str]], filler: int = 200) -> str:
+    """html-страница с латинской таблицей между разделами других языков."""
+    rows = ''.join(f'<tr><th>{gram}</th><td><span class="Latn form-of lang-la {gram}-form-of origin-{lemma}" lang="la">'
+                   f'<a href="/wiki/{form}#Latin" title="{form}">{form}</a></span></td></tr>' for gram, form in cells)
+    other = ('<table class="roa-inflection-table"><tr><td><span class="Ital form-of lang-it 1|s|pres|ind-form-of origin-x" lang="it">'
+             f'<a>{lemma}</a></span></td></tr></table>')
+    return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>' + lemma + '</title></head><body>'
+            '<div class="mw-heading mw-heading2"><h2 id="Italian">Italian</h2></div>' + other +
+            '<div class="mw-heading mw-heading2"><h2 id="Latin">Latin</h2></div><p>Verb &amp; conjugation.</p>'
+            f'<div><table class="inflection-table roa-inflection-table"><tr><th colspan="2"><span class="Latn" lang="la">'
+            f'Conjugation of <i>{lemma}</i></span></th></tr>{rows}</table></div>'
+            '<div class="mw-heading mw-heading2"><h2 id="Portuguese">Portuguese</h2></div>' + other +
+            '<p>Lorem ipsum dolor sit amet.</p>' * filler + '</body></html>')
+
+def verbs(count: int, seed=0, defective: float = 0.0):
+    """count глаголов с разными леммами: пары (лемма, клетки)."""
+    rng = Random(seed)
+    seen = set()
+    while len(seen) < count:
+        lemma, cells = make_verb(rng, make_root(rng), defective)
+        if lemma not in seen:
+            seen.add(lemma)
+            yield lemma, cells
+
+def write_corpus(folder: str, count: int, seed=0, defective: float = 0.0, filler: int = 200) -> list[str]:
+    """Записать count страниц в папку folder (имя файла — лемма) и вернуть их пути."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for lemma, cells in verbs(count, seed, defective):
+        path = os.path.join(folder, lemma + '.html')
+        with open(path, 'w', encoding='utf8') as outp:
+            outp.write(page(lemma, cells, filler))
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Синтетический корпус страниц с таблицами спряжения.')
+    argparser.add_argument('folder', help='папка для страниц')
+    argparser.add_argument('-n', '--count', type=int, default=1000, help='число глаголов')
+    argparser.add_argument('--seed', default=0, help='зерно генератора')
+    argparser.add_argument('--defective', type=float, default=0.05, help='доля пропущенных клеток таблицы')
+    argparser.add_argument('--filler', type=int, default=200, help='абзацев балласта после латинского раздела')
+    args = argparser.parse_args()
+
+    paths = write_corpus(args.folder, args.count, args.seed, args.defective, args.filler)
+    print(f"Страниц записано: {len(paths)} в {args.folder}")
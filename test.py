@@ -1,73 +1,132 @@
 """
 Сбор проверочной выборки словоформ из html-таблиц и проверка на них преобразователя,
-загруженного из файла latest_FST.pkl. Успешным срабатыванием преобразователя считается
+загруженного из файла latest_FST.lvfst (или latest_FST.pkl). Успешным срабатыванием преобразователя считается
 наличие реальной пары "лемма + граммема" среди пар в его выдаче. Наличие "лишних" пар в выдаче
 не берётся во внимание ввиду невозможности их отсеять из-за синкретизма в латинской морфологии.
 Отдельно ведётся учёт полууспешных срабатываний, когда в выдаче есть искомая граммема, но неверно определена лемма.
+
+Проверка идёт без диалога и воспроизводимо: порядок таблиц и выборка словоформ задаются зерном --seed,
+таблицы, на которых учился анализатор (опись в latest_models.pkl), в проверку не берутся. Словоформы проверяются
+порциями в пуле процессов; по каждой в файл пишется запись с итогом, а в конце печатаются точность, точность
+без учёта леммы, число разборов на словоформу и скорость.
+
+    python test.py --size 100 --seed 1 -j 4 -o eval.jsonl
+    python test.py --seed 1 --fst latest_FST.lexicon     # все таблицы, анализатор со словарём лемм
 """
 
+import argparse
+import json
 import os
-import pickle
-from random import shuffle
-from parse import read_html
-from Morphology import demacronize, remacronize, WordForm
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from parse import CORPUS_CACHE, ingest, list_files, verb_folder
+from lookup import load_analyzer
+from Morphology import WordForm
+from macrons import demacronize_all, parse_analysis
+
+analyzer = None # анализатор процесса; исполнители пула наследуют уже открытый или открывают его в init_worker
+
+def collect_sample(sample_size, workers=None, seed=None, corpus=CORPUS_CACHE, paths: list[str] | None = None) -> list[WordForm]:
+    forms, errors = ingest(paths if paths is not None else list_files(verb_folder(), seed), sample_size,
+                           test=True, workers=workers, seed=seed, corpus=corpus)
+    for e in errors:
+        print(e)
+    return [x for sample in forms for x in sample]
+
+def held_out_files(seed=None, state: str | None = None) -> list[str]:
+    """Таблицы папки Verbs в порядке, заданном seed, без тех, на которых учился анализатор (по описи из state)."""
+    paths = list_files(verb_folder(), seed)
+    if state and os.path.exists(state):
+        from Foma import load_state
+        trained = load_state(state)['manifest']
+        paths = [path for path in paths if os.path.basename(path) not in trained]
+    return paths
 
-def collect_sample(sample_size) -> list[WordForm]:
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    verbdir = dir_path + '\\Verbs'
-    directory = os.fsencode(verbdir)
-    files = os.listdir(directory)
-    counter = 0
-    shuffle(files)
-    sample = []
-    for file in files:
-        if counter == sample_size:
-            break
-        filename = os.fsdecode(file)
-        print(filename)
-        with open(f'{verbdir}\\{filename}', encoding="utf8") as fin:
-            [sample.append(x) for x in read_html(fin, test=True)]
-        counter += 1
-    return sample
+def init_worker(path):
+    global analyzer
+    if analyzer is None:
+        analyzer = load_analyzer(path)
 
-with open('latest_FST.pkl', 'rb') as inp:
-    word = pickle.load(inp)
+def check_forms(sample: list[tuple[str, str, str]]) -> list[dict]:
+    """
+    Итоги по порции словоформ (форма, лемма, граммема): 'good' — пара "лемма + граммема" есть в выдаче,
+    'semi' — есть только граммема, 'miss' — нет и её. Выдача сравнивается с эталоном как строки в записи анализатора;
+    на записи Analysis она разбирается и макроны восстанавливаются только для словоформ без верного разбора.
+    """
+    forms = demacronize_all([form for form, _, _ in sample])
+    lemmas = demacronize_all([lemma for _, lemma, _ in sample])
+    records = []
+    for (form, lemma, gram), plain_form, plain_lemma in zip(sample, forms, lemmas):
+        answers = set(analyzer.apply(plain_form))
+        if f'{plain_lemma}\t{gram}' in answers:
+            result = 'good'
+        else:
+            found = [parse_analysis(x) for x in answers]
+            result = 'semi' if any(a.grammeme == gram for a in found) else 'miss'
+        record = {'form': form, 'lemma': lemma, 'grammeme': gram, 'result': result, 'analyses': len(answers)}
+        if result != 'good':
+            record['answers'] = sorted(map(str, found))
+        records.append(record)
+    return records
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-directory = os.fsencode(dir_path + '\\Verbs')
-verbs = os.listdir(directory)
+def evaluate(sample: list[WordForm], path: str | None = None, workers: int = 1, chunk_size: int = 500):
+    """Записи по словоформам выборки в её порядке; в пуле одновременно обрабатывается не больше 2 * workers порций."""
+    items = [(s.form, s.lemma, repr(s.grammeme)) for s in sample]
+    init_worker(path)
+    pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(path,)) if workers > 1 else None
+    pending = deque()
+    try:
+        for i in range(0, len(items), chunk_size):
+            chunk = items[i:i+chunk_size]
+            pending.append(pool.submit(check_forms, chunk) if pool else check_forms(chunk))
+            if len(pending) >= 2 * max(workers, 1):
+                done = pending.popleft()
+                yield from (done.result() if pool else done)
+        while pending:
+            done = pending.popleft()
+            yield from (done.result() if pool else done)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
 
-while True:
-    size = input('Введите желаемый размер проверочной выборки: ')
-    if size == "max":
-        sample = collect_sample(len(verbs))
-        break
-    elif int(size) > 0 and int(size) <= len(verbs):
-        sample = collect_sample(int(size))
-        break
-    else:
-        print(f'Неверный размер; введите целое число от 1 до {len(verbs)}')
+def summarize(records: list[dict], elapsed: float) -> dict:
+    total = len(records)
+    good = sum(1 for r in records if r['result'] == 'good')
+    semigood = sum(1 for r in records if r['result'] == 'semi')
+    return {
+        'forms': total,
+        'accuracy': good / total if total else 0.0,
+        'semi_accuracy': (good + semigood) / total if total else 0.0,
+        'analyses_per_form': sum(r['analyses'] for r in records) / total if total else 0.0,
+        'forms_per_second': total / elapsed if elapsed else 0.0,
+    }
 
-good = 0
-semigood = 0
-for s in sample:
-    verb = demacronize(s.form)
-    grammeme = s.grammeme.__repr__()
-    lemma = s.lemma
-    answers = []
-    grams = set()
-    for x in word.apply(verb):
-        form, gram = x.split("\t")
-        grams.add(gram.strip())
-        answers.append((remacronize(form).strip(), gram.strip()))
-    if (lemma, grammeme) in answers:
-        good += 1
-    else:
-        print(s)
-        print("-"*10)
-        [print(a) for a in answers]
-        print()
-        if grammeme in grams:
-            semigood += 1
+if __name__ == '__main__':
+    from Foma import STATE
+    argparser = argparse.ArgumentParser(description='Проверка анализатора на словоформах из таблиц папки Verbs.')
+    argparser.add_argument('--size', type=int, default=None, help='размер проверочной выборки в лексемах (по умолчанию — все таблицы)')
+    argparser.add_argument('--seed', default=None, help='зерно порядка таблиц и выборки словоформ')
+    argparser.add_argument('-j', '--workers', type=int, default=1, help='число процессов')
+    argparser.add_argument('--fst', default=None, help='файл анализатора (по умолчанию latest_FST.lvfst или latest_FST.pkl)')
+    argparser.add_argument('--state', default=STATE, help='опись обучающих таблиц (они исключаются из проверки)')
+    argparser.add_argument('--include-train', action='store_true', help='не исключать обучающие таблицы')
+    argparser.add_argument('-o', '--output', default='eval_results.jsonl', help='файл записей по словоформам')
+    argparser.add_argument('--summary', default=None, help='файл для итоговых показателей в JSON')
+    argparser.add_argument('--corpus-cache', default=CORPUS_CACHE, help='файл кэша разобранных таблиц')
+    args = argparser.parse_args()
 
-print(f"Точность с учётом выявления леммы: {good / len(sample)}\nБез учёта леммы: {(good + semigood) / len(sample)}")
+    paths = held_out_files(args.seed, None if args.include_train else args.state)
+    sample = collect_sample(args.size, args.workers, args.seed, args.corpus_cache, paths)
+    records = []
+    start = time.perf_counter()
+    with open(args.output, 'w', encoding='utf8') as out:
+        for record in evaluate(sample, args.fst, args.workers):
+            records.append(record)
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    summary = summarize(records, time.perf_counter() - start)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf8') as out:
+            json.dump(summary, out, ensure_ascii=False, indent=1)
+    print(f"Словоформ: {summary['forms']}, разборов на словоформу: {summary['analyses_per_form']:.1f}, словоформ в секунду: {summary['forms_per_second']:.0f}")
+    print(f"Точность с учётом выявления леммы: {summary['accuracy']}\nБез учёта леммы: {summary['semi_accuracy']}")
@@ -0,0 +1,29 @@
+import pickle
+import batch
+from pyfoma import FST
+
+def analyze(tmp_path, monkeypatch, words, cache_size):
+    """Разбор потока порциями по 2 слова; возвращает пары (слово, разборы) и списки слов, отправленных на разбор."""
+    path = tmp_path / 'tiny.pkl'
+    with open(path, 'wb') as outp:
+        pickle.dump(FST.re("(a m o '-'|a m a s):(a m o '-' '\t' '1|s|pres|act|ind')"), outp)
+    calls = []
+    analyze_words = batch.analyze_words
+    monkeypatch.setattr(batch, 'analyze_words', lambda todo: calls.append(todo) or analyze_words(todo))
+    pairs = list(batch.analyze_stream(words, str(path), workers=1, chunk_size=2, cache_size=cache_size))
+    assert [w for w, _ in pairs] == words
+    return pairs, calls
+
+def test_words_in_flight_are_analyzed_once(tmp_path, monkeypatch):
+    # вторая порция уходит в работу раньше, чем готова первая, и её слов ещё нет в кэше
+    pairs, calls = analyze(tmp_path, monkeypatch, ['amō', 'amas', 'amas', 'amō', 'canto', 'amō'], 100)
+    assert calls == [['amō', 'amas'], [], ['canto']]
+    found = dict(pairs)
+    assert [str(a) for a in found['amō']] == ['amō\t1|s|pres|act|ind']
+    assert found['canto'] == []
+
+def test_evicted_words_are_not_reanalyzed_one_by_one(tmp_path, monkeypatch):
+    words = ['amō', 'amas', 'canto', 'amō', 'canto', 'amas', 'amō', 'canto']
+    pairs, calls = analyze(tmp_path, monkeypatch, words, 1)
+    assert len(calls) == len(words) // 2
+    assert [len(found) for _, found in pairs] == [1 if w != 'canto' else 0 for w in words]
@@ -0,0 +1,18 @@
+from Foma import attach_letters, model_fst, normalize
+from Morphology import Grammeme, Lexeme, WordForm, create_models
+from lookup import Analyzer
+
+def suppletive_model():
+    """Модель, у основы которой нет ни одной части: ferō, tulī, lātum не имеют общих букв."""
+    forms = [WordForm('ferō', 'ferō', Grammeme(['1', 's', 'pres', 'act', 'ind'])),
+             WordForm('tulī', 'ferō', Grammeme(['1', 's', 'perf', 'act', 'ind'])),
+             WordForm('lātum', 'ferō', Grammeme(['acc', 'sup']))]
+    return create_models([Lexeme(forms).extract_paradigm()])[0]
+
+def test_stemless_model_gives_no_untagged_analyses():
+    model = suppletive_model()
+    assert model.stem_patterns() == []
+    analyzer = Analyzer(attach_letters(normalize(model_fst(model))))
+    for word in ['canto', 'amo-', 'fero-']:
+        assert all('\t' in analysis for analysis in analyzer.apply(word))
+    assert list(analyzer.apply('canto')) == []
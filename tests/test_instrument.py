@@ -0,0 +1,21 @@
+import tracemalloc
+import instrument
+from instrument import stage, tracer
+
+def test_nested_stage_keeps_outer_peak():
+    instrument.enable(memory=True)
+    try:
+        with stage('compile'):
+            buffer = bytearray(8 << 20)
+            del buffer
+            with stage('determinize'):
+                inner = bytearray(1 << 20)
+                del inner
+        events = {event['stage']: event for event in tracer.events}
+    finally:
+        tracer.enabled = False
+        tracer.events, tracer.samples, tracer.peaks = [], [], []
+        tracemalloc.stop()
+    assert events['determinize']['traced_peak'] >= 1 << 20
+    assert events['compile']['traced_peak'] >= 8 << 20
+    assert events['compile']['peak_rss_growth'] >= 0
@@ -0,0 +1,10 @@
+from random import Random
+from LCS import BitLcsFinder, LcsFinder
+
+def test_bit_finder_matches_reference():
+    rng = Random(1)
+    reference, bit = LcsFinder(), BitLcsFinder()
+    for _ in range(300):
+        words = [''.join(rng.choice('aeiou-bcrst') for _ in range(rng.randint(0, 14))) for _ in range(rng.randint(1, 6))]
+        assert bit.pair_LCS(words[0], words[-1]) == reference.pair_LCS(words[0], words[-1])
+        assert bit.multi_LCS(words) == reference.multi_LCS(words)
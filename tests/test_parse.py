@@ -0,0 +1,13 @@
+import os
+from parse import fingerprint, scan_models
+from synthetic import write_corpus
+
+def test_manifest_fingerprints_come_from_workers_and_cache(tmp_path):
+    paths = write_corpus(str(tmp_path / 'Verbs'), 12, seed=6, filler=1)
+    expected = {os.path.basename(path): fingerprint(path) for path in paths}
+    corpus = str(tmp_path / 'corpus.sqlite')
+    for workers in (2, 1): # первый проход читает страницы в пуле, второй берёт всё из кэша корпуса
+        _, manifest = scan_models(paths, workers=workers, corpus=corpus)
+        assert manifest == expected
+    _, manifest = scan_models(paths, workers=1, corpus=None)
+    assert manifest == expected
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import pickle
+from urllib.parse import quote
+from pyfoma import FST
+from server import AnalysisServer
+
+def tiny_analyzer(tmp_path):
+    path = tmp_path / 'tiny.pkl'
+    with open(path, 'wb') as outp:
+        pickle.dump(FST.re("(a m o '-'):(a m o '-' '\t' '1|s|pres|act|ind')"), outp)
+    return path
+
+async def fetch(port: int, request: str) -> tuple[int, object]:
+    """Один HTTP-запрос по отдельному соединению: код ответа и разобранное тело."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request.encode('utf8'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    writer.close()
+    return status, json.loads(body)
+
+def test_analyze_returns_macron_lemma(tmp_path):
+    path = tiny_analyzer(tmp_path)
+
+    async def ask():
+        server = AnalysisServer(str(path))
+        try:
+            listener = await server.start(port=0)
+            listener.close()
+            return await server.route('POST', '/analyze', json.dumps({'words': ['amō']}).encode('utf8'))
+        finally:
+            server.close()
+
+    status, payload = asyncio.run(ask())
+    assert status == 200
+    assert payload == [{'word': 'amō', 'analyses': [{'lemma': 'amō', 'grammeme': '1|s|pres|act|ind'}]}]
+
+def test_concurrent_http_requests_share_a_batch(tmp_path):
+    path = tiny_analyzer(tmp_path)
+
+    async def ask():
+        server = AnalysisServer(str(path), max_delay=0.2)
+        try:
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            words = ['amō', 'amas', 'canto']
+            answers = await asyncio.gather(*(fetch(port, f'GET /analyze?word={quote(w)} HTTP/1.1\r\nConnection: close\r\n\r\n')
+                                             for w in words))
+            body = json.dumps({'words': ['amō']})
+            cached = await fetch(port, f'POST /analyze HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n{body}')
+            stats = await fetch(port, 'GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n')
+            listener.close()
+            return answers, cached, stats
+        finally:
+            server.close()
+
+    answers, cached, (_, stats) = asyncio.run(ask())
+    assert [status for status, _ in answers] == [200, 200, 200]
+    assert answers[0][1] == [{'word': 'amō', 'analyses': [{'lemma': 'amō', 'grammeme': '1|s|pres|act|ind'}]}]
+    assert answers[2][1] == [{'word': 'canto', 'analyses': []}]
+    assert cached == (200, answers[0][1])
+    # три одновременных запроса ушли в пул одной пачкой, а повтор взят из кэша
+    assert stats['batches'] == 1 and stats['mean_batch'] == 3.0
+    assert stats['cache_hits'] == 1 and stats['requests'] == 4
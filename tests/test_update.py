@@ -0,0 +1,63 @@
+import os
+from Morphology import induce_models
+from parse import fingerprint, ingest, scan_models
+from synthetic import page, verbs, write_corpus
+from update import find_changes, refresh_models
+
+def summary(models):
+    """Модели без пропусков: то, что из них попадает в преобразователь, и число основ."""
+    return [(m.name, sorted(m.expressions), [(a.form, repr(a.grammeme)) for a in m.affixes], m.power)
+            for m in models if m is not None]
+
+def rewrite(path, lemma, cells):
+    with open(path, 'w', encoding='utf8') as outp:
+        outp.write(page(lemma, cells, filler=1))
+
+def check_update(folder, paths, gone, changed):
+    """Обновить модели по изменениям и сравнить с induce_models по итоговому корпусу в том же порядке."""
+    inducer, _ = scan_models(paths, workers=1, corpus=None)
+    names = [os.path.basename(path) for path in paths]
+    order = [os.path.join(folder, name) for name in names if name not in gone] + changed
+    for path in changed:
+        if os.path.basename(path) in names:
+            rewrite(path, *next(verbs(1, seed=os.path.basename(path), defective=0.0)))
+    for name in gone:
+        if os.path.join(folder, name) not in changed:
+            os.remove(os.path.join(folder, name))
+    inducer, added = refresh_models(inducer, gone, changed, folder, workers=1, corpus=None)
+    paradigms, _ = ingest(order, workers=1)
+    assert summary(inducer.models) == summary(induce_models(paradigms))
+    assert set(added) <= set(inducer.sources)
+    return inducer
+
+def corpus(tmp_path):
+    folder = str(tmp_path)
+    paths = write_corpus(folder, 80, seed=3, defective=0.0, filler=1)
+    inducer, _ = scan_models(paths, workers=1, corpus=None)
+    return folder, paths, inducer
+
+def test_update_without_openers_matches_full_induction(tmp_path):
+    folder, paths, inducer = corpus(tmp_path)
+    members = [name for name, (number, _) in inducer.sources.items() if inducer.openers[number] != name]
+    assert len(members) >= 3
+    new = write_corpus(os.path.join(folder, 'new'), 5, seed=4, defective=0.0, filler=1)
+    changed = [os.path.join(folder, members[1])] + new
+    check_update(folder, paths, [members[0], members[1]], changed)
+
+def test_update_of_opener_matches_full_induction(tmp_path):
+    folder, paths, inducer = corpus(tmp_path)
+    openers = [name for name in inducer.sources if inducer.opened(name)]
+    assert len(openers) >= 2
+    changed = [os.path.join(folder, openers[1])]
+    updated = check_update(folder, paths, [openers[0], openers[1]], changed)
+    assert len(updated.models) == len([m for m in updated.models if m is not None])
+
+def test_copied_pages_with_old_mtime_are_new(tmp_path):
+    folder = str(tmp_path)
+    read, skipped, copied = write_corpus(folder, 3, seed=5, filler=1)
+    for path in (read, skipped, copied):
+        os.utime(path, ns=(10**9, 10**9)) # как после cp -p: время изменения старше прошлой сборки
+    manifest = {os.path.basename(read): fingerprint(read)}
+    listed = {os.path.basename(read), os.path.basename(skipped)}
+    changed, removed = find_changes(manifest, 2 * 10**9, folder, listed=listed)
+    assert changed == [copied] and removed == []
@@ -0,0 +1,60 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from wikiscan import Fetcher, load_verbs
+
+class Wiki(BaseHTTPRequestHandler):
+    """Подмена Викисловаря: amo сначала отвечает 503 и 429, потом отдаётся с ETag; прочих страниц нет."""
+    protocol_version = 'HTTP/1.1'
+    log = []
+
+    def do_GET(self):
+        self.log.append((self.path, self.headers.get('If-None-Match')))
+        tries = sum(1 for path, _ in self.log if path == self.path)
+        if self.path != '/wiki/amo':
+            self.reply(404, b'')
+        elif tries == 1:
+            self.reply(503, b'', {'Retry-After': '0'})
+        elif tries == 2:
+            self.reply(429, b'')
+        elif self.headers.get('If-None-Match') == '"v1"':
+            self.reply(304, None, {'ETag': '"v1"'})
+        else:
+            self.reply(200, b'<html>amo</html>', {'ETag': '"v1"'})
+
+    def reply(self, status, body, headers={}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if body is not None:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_fetcher_retries_and_resumes(tmp_path):
+    wiki = ThreadingHTTPServer(('127.0.0.1', 0), Wiki)
+    threading.Thread(target=wiki.serve_forever, daemon=True).start()
+    try:
+        fetcher = Fetcher(f'http://127.0.0.1:{wiki.server_address[1]}/wiki/', rate=0, backoff=0.01)
+        run = lambda refresh=False: load_verbs(['amo', 'nemo'], str(tmp_path / 'Verbs'), str(tmp_path / 'manifest.jsonl'),
+                                               workers=2, refresh=refresh, fetcher=fetcher)
+        assert run() == {'fetched': 1, 'missing': 1}
+        assert (tmp_path / 'Verbs' / 'amo.html').read_bytes() == b'<html>amo</html>'
+        assert [path for path, _ in Wiki.log].count('/wiki/amo') == 3 # 503, 429 и удачная попытка
+        # продолжение по описи: ни скачанная, ни отсутствующая страница заново не запрашиваются
+        asked = len(Wiki.log)
+        assert run() == {'skipped': 2}
+        assert len(Wiki.log) == asked
+        # перепроверка: условный запрос с ETag из описи, страница не меняется
+        assert run(refresh=True) == {'unchanged': 1, 'missing': 1}
+        assert ('/wiki/amo', '"v1"') in Wiki.log[asked:]
+    finally:
+        wiki.shutdown()
+
+def test_delay_follows_retry_after_or_backs_off():
+    fetcher = Fetcher(backoff=1.0)
+    assert fetcher.delay(3, '7') == 7.0
+    assert all(0.5 * 2 ** attempt <= fetcher.delay(attempt, None) <= 1.5 * 2 ** attempt for attempt in range(4))
@@ -0,0 +1,97 @@
+"""
+Инкрементное обновление анализатора после добавления или правки страниц в папке Verbs без полной пересборки.
+Берутся модели и опись файлов последней сборки (latest_models.pkl, его пишут Foma.py и сам update.py),
+читаются только новые и изменившиеся страницы, их основы добавляются в модели (или открывают новые модели),
+основы изменившихся и удалённых страниц из моделей убираются. Если изменилась или пропала страница, открывшая
+модель с другими основами, модели собираются заново по всем страницам в прежнем порядке (неизменившиеся
+берутся из кэша корпуса), так что итог всегда тот же, что у сборки с нуля по тем же страницам. Затем дерево объединений пересобирается
+через кэш fst_cache: заново компилируются только модели, у которых изменились выражения основ или набор аффиксов,
+и сливаются только узлы над ними. Последний шаг (приписывание $letter+ к аффиксам) делается целиком.
+
+    python update.py                      # страницы, изменённые после последней сборки, и удалённые
+    python update.py Verbs/amō.html -j 4  # только указанные файлы
+"""
+
+import argparse
+import os
+import time
+from Foma import STATE, build, load_state, save_fst, save_state, verbdir
+from fstcache import FstCache, model_key
+from Morphology import ModelInducer
+from parse import CORPUS_CACHE, fingerprint, scan_models
+
+def find_changes(manifest: dict, started: int, folder: str, paths: list[str] | None = None, listed: set[str] = frozenset()):
+    """
+    Файлы, которые нужно прочитать заново (новые или с другим содержимым), и имена удалённых файлов из описи.
+    Без paths просматриваются все файлы папки, которых не было в ней к прошлой сборке (listed) и нет в описи,
+    каким бы ни было их время изменения (cp -p, rsync -a и распаковка архива сохраняют старое), а из остальных —
+    изменённые после начала прошлой сборки. У файлов, которые лишь «потрогали», обновляется время в описи.
+    """
+    if paths is None:
+        names = [os.fsdecode(name) for name in os.listdir(os.fsencode(folder))]
+        paths = [os.path.join(folder, name) for name in sorted(names)
+                 if name not in manifest and name not in listed or os.stat(os.path.join(folder, name)).st_mtime_ns >= started]
+        removed = [name for name in manifest if not os.path.exists(os.path.join(folder, name))]
+    else:
+        removed = [os.path.basename(path) for path in paths if not os.path.exists(path) and os.path.basename(path) in manifest]
+        paths = [path for path in paths if os.path.exists(path)]
+    changed = []
+    for path in paths:
+        name = os.path.basename(path)
+        current = fingerprint(path)
+        if name in manifest and manifest[name][2] == current[2]:
+            manifest[name] = current
+        else:
+            changed.append(path)
+    return changed, removed
+
+def refresh_models(inducer: ModelInducer, gone: list[str], changed: list[str], folder: str, workers: int | None = None,
+                   corpus: str | None = CORPUS_CACHE):
+    """
+    Убрать из моделей основы страниц gone (имена удалённых и изменившихся) и добавить основы файлов changed.
+    Возвращает inducer (новый, если модели пришлось собрать заново) и опись прочитанных файлов.
+    """
+    gone = [name for name in gone if name in inducer.sources]
+    if any(inducer.opened(name) for name in gone):
+        skip = set(gone)
+        kept = [os.path.join(folder, name) for name in inducer.sources if name not in skip]
+        return scan_models(kept + changed, None, workers, None, corpus, ModelInducer(inducer.keep_stems))
+    for name in gone:
+        inducer.remove(name)
+    return scan_models(changed, None, workers, None, corpus, inducer)
+
+def update(state_path: str = STATE, paths: list[str] | None = None, workers: int | None = None,
+           cache: FstCache | None = None, corpus: str | None = CORPUS_CACHE):
+    state = load_state(state_path)
+    inducer, manifest = state['inducer'], state['manifest']
+    started = time.time_ns()
+    listed = set(state.get('listed', ()))
+    changed, removed = find_changes(manifest, state['started'], verbdir, paths, listed)
+    if not changed and not removed:
+        print("Новых или изменившихся страниц нет")
+        return None
+    before = {model_key(model) for model in inducer.models if model is not None}
+    inducer, added = refresh_models(inducer, removed + [os.path.basename(path) for path in changed], changed, verbdir, workers, corpus)
+    manifest = {name: added[name] if name in added else manifest[name] for name in inducer.sources}
+    after = [model_key(model) for model in inducer.models if model is not None]
+    affected = sum(1 for key in after if key not in before)
+    print(f"Страниц прочитано: {len(changed)}, удалено: {len(removed)}, моделей затронуто: {affected} из {len(after)}")
+
+    fsm = build(inducer.models, workers, cache)
+    print(f"FST готов, состояний: {len(fsm)}")
+    save_fst(fsm)
+    listed = (listed | {os.path.basename(path) for path in changed}) - set(removed)
+    save_state(state_path, inducer, manifest, started, sorted(listed))
+    return fsm
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Инкрементное обновление анализатора по новым и изменившимся таблицам.')
+    argparser.add_argument('files', nargs='*', help='файлы для добавления или обновления (по умолчанию — все изменённые после последней сборки)')
+    argparser.add_argument('-j', '--workers', type=int, default=None, help='число процессов')
+    argparser.add_argument('--state', default=STATE, help='файл моделей последней сборки')
+    argparser.add_argument('--cache', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fst_cache'), help='папка кэша скомпилированных моделей')
+    argparser.add_argument('--cache-size', type=int, default=1024, help='предельный размер кэша в мегабайтах')
+    argparser.add_argument('--corpus-cache', default=CORPUS_CACHE, help='файл кэша разобранных таблиц')
+    args = argparser.parse_args()
+
+    update(args.state, args.files or None, args.workers, FstCache(args.cache, args.cache_size << 20), args.corpus_cache)
@@ -1,49 +1,274 @@
 """
 Модуль, использованный для загрузки страниц Викисловаря с латинскими глаголами. Список страниц Latin verbs.txt собран вручную.
+
+Страницы качаются в несколько потоков (--workers), но не чаще заданного числа запросов в секунду (--rate,
+общее "ведро с жетонами" на все потоки); каждый поток держит одно постоянное соединение. На временные ошибки
+(обрыв связи, 429, 5xx) запрос повторяется с растущей паузой (или паузой из Retry-After), отсутствующие страницы
+отмечаются и не прерывают загрузку. Итог по каждому глаголу дописывается в опись (fetch_manifest.jsonl) сразу,
+так что прерванную загрузку можно продолжить с того же места. С --refresh уже скачанные страницы перепроверяются
+условными запросами (If-None-Match / If-Modified-Since по ETag и Last-Modified из описи), и неизменённые не качаются заново.
+Адрес можно подменить (--base-url), например на локальный сервер для проверки.
+
+    python wikiscan.py --workers 4 --rate 2
+    python wikiscan.py --refresh
 """
 
-import urllib.request as urr
-import urllib.parse as urp
-import urllib.error as ure
-from time import sleep
+import argparse
+import http.client
+import json
 import os
+import random
+import threading
+import time
+import urllib.parse as urp
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BASE_URL = 'https://en.wiktionary.org/wiki/'
+HEADERS = {'User-Agent': 'LatinVerbFOMA/1.0 (https://github.com/KyriGidsson/LatinVerbFOMA)', 'Accept-Encoding': 'identity'}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REDIRECTS = {301, 302, 303, 307, 308}
+
+class FetchError(Exception):
+    """Страницу не удалось получить и после всех повторов."""
+
+    def __init__(self, verb: str, reason: str):
+        super().__init__(f'{verb}: {reason}')
+        self.verb = verb
+        self.reason = reason
+
+class TokenBucket:
+    """Не больше rate запросов в секунду в среднем и не больше burst подряд; общий для всех потоков."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class Manifest:
+    """
+    Опись загрузки в формате JSON Lines: по строке на каждый итог, действует последняя строка глагола.
+    Строки дописываются и сбрасываются на диск сразу, так что после обрыва теряется не больше одной (недописанной) строки.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as fin:
+                for line in fin:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry['verb']] = entry
+        self.lock = threading.Lock()
+        self.out = open(path, 'a', encoding='utf8')
+
+    def get(self, verb: str) -> dict:
+        return self.entries.get(verb, {})
+
+    def record(self, verb: str, **entry):
+        entry = {'verb': verb, **entry, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with self.lock:
+            self.entries[verb] = entry
+            self.out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.out.flush()
+
+    def close(self):
+        self.out.close()
 
-def rob_wiktionary(verb, write_to_file=True):
-    # прикинемся браузером
-    HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'}
+class Fetcher:
+    """
+    Клиент с постоянным соединением в каждом потоке, ограничением частоты и повторами.
+    fetch возвращает (код, заголовки, тело); 200, 304, 404 и 410 — окончательные ответы, остальное — FetchError.
+    """
 
-    source = "https://en.wiktionary.org/wiki/" + urp.quote(verb)
-    request = urr.Request(source, headers=HEADERS)
+    def __init__(self, base_url: str = BASE_URL, rate: float = 1.0, burst: int = 1, retries: int = 5,
+                 backoff: float = 1.0, timeout: float = 30.0):
+        self.base_url = base_url
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.target != (scheme, host):
+            if conn is not None:
+                conn.close()
+            factory = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = factory(host, timeout=self.timeout)
+            self.local.conn, self.local.target = conn, (scheme, host)
+        return conn
+
+    def drop(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def request(self, url: str, headers: dict) -> tuple[int, dict, bytes]:
+        """Один GET по постоянному соединению потока (с ожиданием жетона)."""
+        parts = urp.urlsplit(url)
+        conn = self.connection(parts.scheme, parts.netloc)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        self.bucket.take()
+        try:
+            conn.request('GET', path, headers={**HEADERS, **headers})
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            self.drop()
+            raise
+        if response.will_close:
+            self.drop()
+        return response.status, {k.lower(): v for k, v in response.getheaders()}, body
+
+    def delay(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after and retry_after.strip().isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** attempt * (0.5 + random.random())
+
+    def fetch(self, verb: str, etag: str | None = None, modified: str | None = None) -> tuple[int, dict, bytes]:
+        url = self.base_url + urp.quote(verb)
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if modified:
+            headers['If-Modified-Since'] = modified
+        attempt = redirects = 0
+        while True:
+            retry_after = None
+            try:
+                status, response_headers, body = self.request(url, headers)
+            except (http.client.HTTPException, OSError) as e:
+                reason = f'{type(e).__name__}: {e}'
+            else:
+                if status in (200, 304, 404, 410):
+                    return status, response_headers, body
+                if status in REDIRECTS and 'location' in response_headers and redirects < 5:
+                    url = urp.urljoin(url, response_headers['location'])
+                    redirects += 1
+                    continue
+                if status not in RETRY_STATUSES:
+                    raise FetchError(verb, f'HTTP {status}')
+                reason = f'HTTP {status}'
+                retry_after = response_headers.get('retry-after')
+            if attempt >= self.retries:
+                raise FetchError(verb, reason)
+            time.sleep(self.delay(attempt, retry_after))
+            attempt += 1
+
+def page_path(folder: str, verb: str) -> str:
+    return os.path.join(folder, verb + '.html')
+
+def save_page(path: str, body: bytes):
+    """Записать страницу через временный файл, чтобы при обрыве не осталось половины страницы."""
+    temp = path + '.part'
+    with open(temp, 'wb') as fout:
+        fout.write(body)
+    os.replace(temp, path)
+
+def download(fetcher: Fetcher, manifest: Manifest, verb: str, folder: str, refresh=False) -> str:
+    """
+    Скачать страницу глагола, если нужно. Возвращает итог: 'fetched', 'unchanged', 'missing', 'skipped' или 'error'.
+    Без refresh уже скачанные и отмеченные отсутствующими страницы пропускаются, с refresh — перепроверяются.
+    """
+    entry = manifest.get(verb)
+    path = page_path(folder, verb)
+    exists = os.path.exists(path)
+    if not refresh and (exists or entry.get('status') == 'missing'):
+        return 'skipped'
+    etag = entry.get('etag') if exists else None
+    modified = entry.get('last_modified') if exists else None
     try:
-        response = urr.urlopen(request)
-    except ure.HTTPError as e:
-        print(e)
-        exit()
-    contents = response.read().decode("utf8")
+        status, headers, body = fetcher.fetch(verb, etag, modified)
+    except FetchError as e:
+        manifest.record(verb, status='error', reason=e.reason)
+        return 'error'
+    if status == 304:
+        manifest.record(verb, status='ok', etag=etag, last_modified=modified, bytes=os.path.getsize(path))
+        return 'unchanged'
+    if status != 200:
+        manifest.record(verb, status='missing', http=status)
+        return 'missing'
+    save_page(path, body)
+    manifest.record(verb, status='ok', etag=headers.get('etag'), last_modified=headers.get('last-modified'), bytes=len(body))
+    return 'fetched'
 
-    if write_to_file:
-        with open(verbdir + verb + ".html", "w", encoding="utf8") as fout:
-            fout.write(contents)
-
-    return contents
-
-def load_verbs():
-    # загружаем список глаголов
-    print('Loading verbs...')
-    verbs = []
-    seen = []
-    for file in os.listdir(verbdir):
-        if file.endswith(".html"):
-            seen.append(file.split('.')[0])
-    with open ("Latin verbs.txt", 'r', encoding='utf8') as fin:
-        for line in fin:
-            if line.strip() not in seen:
-                verbs.append(line.strip())
+def read_verbs(path: str = 'Latin verbs.txt') -> list[str]:
+    with open(path, encoding='utf8') as fin:
+        return list(dict.fromkeys(line.strip() for line in fin if line.strip()))
 
+def load_verbs(verbs: list[str] | None = None, folder: str | None = None, manifest_path: str | None = None, workers: int = 4,
+               rate: float = 1.0, refresh=False, fetcher: Fetcher | None = None) -> Counter:
+    """Скачать страницы глаголов (по умолчанию — из Latin verbs.txt) в папку Verbs. Возвращает счётчик итогов."""
+    verbs = read_verbs() if verbs is None else verbs
+    folder = folder or verbdir
+    os.makedirs(folder, exist_ok=True)
+    fetcher = fetcher or Fetcher(rate=rate)
+    manifest = Manifest(manifest_path or os.path.join(dir_path, 'fetch_manifest.jsonl'))
+    counts = Counter()
     print(f"Scanning {len(verbs)} verbs...")
-    for verb in verbs:
-        rob_wiktionary(verb)
-        sleep(3)
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            futures = {pool.submit(download, fetcher, manifest, verb, folder, refresh): verb for verb in verbs}
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                counts[result] += 1
+                if result == 'error':
+                    print(f"{futures[future]}: {manifest.get(futures[future])['reason']}")
+                if done % 100 == 0:
+                    print(f"{done}/{len(verbs)}: {dict(counts)}")
+    finally:
+        manifest.close()
+    return counts
+
+def rob_wiktionary(verb, write_to_file=True, fetcher: Fetcher | None = None):
+    """Скачать одну страницу и вернуть её текст; при неудаче — FetchError."""
+    status, _, body = (fetcher or Fetcher()).fetch(verb)
+    if status != 200:
+        raise FetchError(verb, f'HTTP {status}')
+    if write_to_file:
+        save_page(page_path(verbdir, verb), body)
+    return body.decode('utf8')
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
-verbdir = dir_path + '\\Verbs\\'
\ No newline at end of file
+verbdir = os.path.join(dir_path, 'Verbs')
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Загрузка страниц латинских глаголов из Викисловаря.')
+    argparser.add_argument('verbs', nargs='?', default='Latin verbs.txt', help='список глаголов, по одному в строке')
+    argparser.add_argument('--folder', default=verbdir, help='папка для страниц')
+    argparser.add_argument('--manifest', default=os.path.join(dir_path, 'fetch_manifest.jsonl'), help='опись загрузки (для продолжения и условных запросов)')
+    argparser.add_argument('-j', '--workers', type=int, default=4, help='число одновременных запросов')
+    argparser.add_argument('--rate', type=float, default=1.0, help='не больше стольких запросов в секунду (0 — без ограничения)')
+    argparser.add_argument('--burst', type=int, default=1, help='сколько запросов можно сделать подряд без паузы')
+    argparser.add_argument('--retries', type=int, default=5, help='повторов при временных ошибках')
+    argparser.add_argument('--backoff', type=float, default=1.0, help='начальная пауза перед повтором, с (дальше растёт вдвое)')
+    argparser.add_argument('--timeout', type=float, default=30.0, help='тайм-аут соединения, с')
+    argparser.add_argument('--refresh', action='store_true', help='перепроверить уже скачанные страницы условными запросами')
+    argparser.add_argument('--base-url', default=BASE_URL, help='адрес, к которому дописывается имя страницы')
+    args = argparser.parse_args()
+
+    fetcher = Fetcher(args.base_url, args.rate, args.burst, args.retries, args.backoff, args.timeout)
+    counts = load_verbs(read_verbs(args.verbs), args.folder, args.manifest, args.workers, refresh=args.refresh, fetcher=fetcher)
+    print(f"Done: {dict(counts)}")